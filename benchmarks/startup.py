@@ -0,0 +1,71 @@
+"""
+Cold start benchmark: for every handler with a sample event in test/, measures in a fresh interpreter the time to
+import lambda_handlers and the time of the first call, and reports which heavy dependencies the call loaded.
+
+Usage: python benchmarks/startup.py [--repeat N]
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CODE_PATH = os.path.join(ROOT_PATH, 'code')
+EVENTS_PATH = os.path.join(ROOT_PATH, 'test')
+HEAVY_MODULES = ['numpy', 'scipy', 'jsonschema']
+
+# Run in a fresh interpreter for every measurement, so that nothing is imported yet
+PROBE = '''
+import json, sys, time
+start = time.time()
+import lambda_handlers
+imported = time.time()
+response = getattr(lambda_handlers, sys.argv[1] + '_handler')(json.loads(sys.argv[2]), None)
+called = time.time()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_call_ms': (called - imported) * 1000,
+    'loaded': [name for name in %r if name in sys.modules],
+    'error': response.get('error')
+}))
+''' % HEAVY_MODULES
+
+
+def sample_events():
+    """
+    Returns (handler name, event) pairs for the sample events of the handlers.
+    """
+    import lambda_handlers
+    for file_name in sorted(os.listdir(EVENTS_PATH)):
+        name, extension = os.path.splitext(file_name)
+        if extension == '.json' and hasattr(lambda_handlers, name + '_handler'):
+            with open(os.path.join(EVENTS_PATH, file_name)) as event_file:
+                yield name, json.load(event_file)
+
+
+def measure(name, event):
+    """
+    Runs the probe for one handler and event in a fresh interpreter.
+    """
+    output = subprocess.check_output([sys.executable, '-c', PROBE, name, json.dumps(event)], cwd=CODE_PATH)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per handler; the median is reported')
+    args = parser.parse_args()
+
+    sys.path.insert(0, CODE_PATH)
+    print('{:<14} {:>10} {:>14}  {}'.format('handler', 'import ms', 'first call ms', 'loaded'))
+    for name, event in sample_events():
+        runs = [measure(name, event) for _ in range(args.repeat)]
+        import_ms = sorted(run['import_ms'] for run in runs)[len(runs) // 2]
+        first_call_ms = sorted(run['first_call_ms'] for run in runs)[len(runs) // 2]
+        print('{:<14} {:>10.1f} {:>14.1f}  {}'.format(name, import_ms, first_call_ms, ', '.join(runs[0]['loaded']) or '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Benchmark suite: times every handler and financial function across input sizes, reports latency percentiles and
+throughput, and compares the median latencies against a stored baseline.
+
+Usage: python benchmarks/suite.py [--filter REGEX] [--min-time SECONDS] [--save-baseline] [--check] [--threshold RATIO]
+
+Baselines only compare on the machine they were saved on: save one before a change (or NumPy upgrade) and check
+against it after.
+"""
+from __future__ import print_function
+import argparse
+import base64
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import warnings
+from timeit import default_timer as timer
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CODE_PATH = os.path.join(ROOT_PATH, 'code')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SIZES = [10, 1000, 100000]
+BATCH_SIZE = 1000
+
+
+def cash_flows(size, seed=1):
+    """
+    Returns an initial outflow followed by size - 1 inflows whose rate of return is around 8%.
+    """
+    generator = random.Random(seed)
+    inflows = [generator.uniform(50, 150) for _ in range(size - 1)]
+    total = sum(value / 1.08 ** period for period, value in enumerate(inflows[:1000], 1))
+    return [-round(total, 2)] + [round(value, 2) for value in inflows]
+
+
+def date_objects(size):
+    start = datetime.date(2000, 1, 1)
+    return [start + datetime.timedelta(weeks=i) for i in range(size)]
+
+
+def dates(size):
+    return [date.isoformat() for date in date_objects(size)]
+
+
+def loans(size, seed=2):
+    """
+    Returns size loan scenarios as a dict of lists: rate, nper, pv, pmt.
+    """
+    generator = random.Random(seed)
+    rates = [generator.uniform(0.002, 0.01) for _ in range(size)]
+    npers = [generator.choice([60, 120, 180, 360]) for _ in range(size)]
+    pvs = [generator.uniform(1e4, 5e5) for _ in range(size)]
+    pmts = [-pv * r / (1 - (1 + r) ** -n) for r, n, pv in zip(rates, npers, pvs)]
+    return {'rate': rates, 'nper': npers, 'pv': pvs, 'pmt': pmts}
+
+
+def function_cases():
+    """
+    Yields (name, size, function, args) for the functions of financial_functions.
+    """
+    import numpy
+    import financial_functions as ff
+
+    scalar = {'rate': 0.00625, 'nper': 180, 'pv': 200000, 'pmt': -1854.02472}
+    yield 'fv', 1, ff.fv, (scalar['rate'], scalar['nper'], scalar['pmt'], scalar['pv'])
+    yield 'pv', 1, ff.pv, (scalar['rate'], scalar['nper'], scalar['pmt'])
+    yield 'pmt', 1, ff.pmt, (scalar['rate'], scalar['nper'], scalar['pv'])
+    yield 'ipmt', 1, ff.ipmt, (scalar['rate'], 12, scalar['nper'], scalar['pv'])
+    yield 'ppmt', 1, ff.ppmt, (scalar['rate'], 12, scalar['nper'], scalar['pv'])
+    yield 'nper', 1, ff.nper, (scalar['rate'], scalar['pmt'], scalar['pv'])
+    yield 'rate', 1, ff.rate, (scalar['nper'], scalar['pmt'], scalar['pv'])
+
+    for size in SIZES[1:]:
+        arrays = dict((name, numpy.array(values)) for name, values in loans(size).items())
+        yield 'fv', size, ff.fv, (arrays['rate'], arrays['nper'], arrays['pmt'], arrays['pv'])
+        yield 'pv', size, ff.pv, (arrays['rate'], arrays['nper'], arrays['pmt'])
+        yield 'pmt', size, ff.pmt, (arrays['rate'], arrays['nper'], arrays['pv'])
+        yield 'ipmt', size, ff.ipmt, (arrays['rate'], 12, arrays['nper'], arrays['pv'])
+        yield 'ppmt', size, ff.ppmt, (arrays['rate'], 12, arrays['nper'], arrays['pv'])
+        yield 'nper', size, ff.nper, (arrays['rate'], arrays['pmt'], arrays['pv'])
+        yield 'rate', size, ff.rate, (arrays['nper'], arrays['pmt'], arrays['pv'])
+
+    for size in SIZES:
+        values = cash_flows(size)
+        yield 'npv', size, ff.npv, (0.08, values)
+        yield 'npv_analytics', size, ff.npv_analytics, (0.08, values)
+        yield 'irr', size, ff.irr, (values,)
+        yield 'mirr', size, ff.mirr, (values, 0.1, 0.12)
+        yield 'xnpv', size, ff.xnpv, (0.08, values, dates(size))
+        yield 'xnpv_analytics', size, ff.xnpv_analytics, (0.08, values, dates(size))
+        yield 'xirr', size, ff.xirr, (values, dates(size))
+        yield 'xnpv_30_360', size, ff.xnpv, (0.08, values, dates(size), '30/360')
+        yield 'xnpv_act_act_isda', size, ff.xnpv, (0.08, values, dates(size), 'ACT/ACT ISDA')
+        yield 'fvschedule', size, ff.fvschedule, (1000, [0.01] * size)
+        # date conversion alone, which the year fraction cache hides from the repeated xnpv calls above
+        yield 'days_iso_strings', size, getattr(ff, '__days'), (dates(size),)
+        yield 'days_date_objects', size, getattr(ff, '__days'), (date_objects(size),)
+
+    rates = numpy.random.RandomState(3).uniform(0, 0.0002, (10000, 365))
+    yield 'fvschedule_many', rates.size, ff.fvschedule_many, (numpy.full(10000, 1000.0), rates)
+    yield 'fvschedule_many_path', rates.size, lambda p, r: ff.fvschedule_many(p, r, path=True), (
+        numpy.full(10000, 1000.0), rates)
+
+    schedules = 10000
+    values = cash_flows(12) * schedules
+    offsets = list(range(0, 12 * schedules + 1, 12))
+    yield 'xirr_many', schedules, ff.xirr_many, (values, dates(12) * schedules, offsets)
+
+    # 20 years of monthly flows with calls early in every 5 year cycle and distributions after
+    months = numpy.arange(240)
+    generator = numpy.random.RandomState(4)
+    fund = numpy.where(months % 60 < 20, -generator.uniform(50, 150, 240), generator.uniform(20, 200, 240))
+    fund_dates = numpy.datetime64('2000-01-01') + 30 * months
+    for window in [12, 36, 60]:
+        yield 'rolling_irr', window, ff.rolling_irr, (fund, window)
+        yield 'rolling_xirr', window, ff.rolling_xirr, (fund, fund_dates, window)
+
+    for size in [360, 100000]:
+        yield 'amortization', size, ff.amortization, (0.00625, size, 200000)
+
+    yield 'effect', 1, ff.effect, (0.0525, 4)
+    yield 'nominal', 1, ff.nominal, (0.053543, 4)
+    yield 'sln', 1, ff.sln, (30000, 7500, 10)
+
+
+def handler_cases():
+    """
+    Yields (name, size, handler, args) for the handlers of lambda_handlers, with single and batch requests.
+    """
+    import numpy
+    import lambda_handlers as lh
+
+    loan = loans(BATCH_SIZE)
+    single = {
+        'fv': lambda i: {'rate': loan['rate'][i], 'nper': loan['nper'][i], 'pmt': loan['pmt'][i], 'pv': loan['pv'][i]},
+        'pv': lambda i: {'rate': loan['rate'][i], 'nper': loan['nper'][i], 'pmt': loan['pmt'][i]},
+        'pmt': lambda i: {'rate': loan['rate'][i], 'nper': loan['nper'][i], 'pv': loan['pv'][i]},
+        'ppmt': lambda i: {'rate': loan['rate'][i], 'per': 12, 'nper': loan['nper'][i], 'pv': loan['pv'][i]},
+        'nper': lambda i: {'rate': loan['rate'][i], 'pmt': loan['pmt'][i], 'pv': loan['pv'][i]},
+        'rate': lambda i: {'nper': loan['nper'][i], 'pmt': loan['pmt'][i], 'pv': loan['pv'][i]},
+    }
+    for name in sorted(single):
+        handler = getattr(lh, name + '_handler')
+        yield name + '_handler', 1, handler, (single[name](0), None)
+        yield name + '_handler', BATCH_SIZE, handler, ({'batch': [single[name](i) for i in range(BATCH_SIZE)]}, None)
+
+    grid = {'grid': {'rate': [i / 10000.0 for i in range(1, 51)], 'nper': list(range(12, 372, 12))}, 'pv': 250000}
+    yield 'pmt_handler_grid', 50 * 30, lh.pmt_handler, (grid, None)
+
+    for size in SIZES:
+        values = cash_flows(size)
+        yield 'npv_handler', size, lh.npv_handler, ({'rate': 0.08, 'values': values}, None)
+        yield 'irr_handler', size, lh.irr_handler, ({'values': values}, None)
+        yield 'mirr_handler', size, lh.mirr_handler, (
+            {'values': values, 'finance_rate': 0.1, 'reinvest_rate': 0.12}, None)
+        encoded = base64.b64encode(numpy.asarray(values, dtype='<f8').tobytes()).decode('ascii')
+        yield 'npv_handler_base64', size, lh.npv_handler, ({'rate': 0.08, 'values': encoded}, None)
+        yield 'irr_handler_base64', size, lh.irr_handler, ({'values': encoded}, None)
+
+    state = lh.npv_update_handler({'rates': 0.08, 'append': [
+        {'value': value, 'period': period} for period, value in enumerate(cash_flows(10000))]}, None)['result']['state']
+    update = {'state': state, 'append': [{'value': 100.0, 'period': 10000}]}
+    yield 'npv_update_handler', 1, lh.npv_update_handler, (update, None)
+
+    for size in [12, 360]:
+        request = {'rate': 0.00625, 'nper': size, 'pv': 200000}
+        yield 'amortization_handler', size, lh.amortization_handler, (request, None)
+
+    calls = [dict(single['pmt'](i), function='pmt') for i in range(BATCH_SIZE // 2)]
+    calls += [dict(single['fv'](i), function='fv') for i in range(BATCH_SIZE // 2)]
+    yield 'router_handler', 1, lh.router_handler, (dict(single['pmt'](0), function='pmt'), None)
+    yield 'router_handler', BATCH_SIZE, lh.router_handler, ({'calls': calls}, None)
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def measure(function, args, min_time, min_samples=5, max_samples=10000, min_sample_time=1e-4):
+    """
+    Calls function(*args) to warm up and to find how many calls take at least min_sample_time, then times such
+    groups of calls for at least min_time seconds and min_samples groups, so that the timer's own overhead does not
+    drown the fastest functions. Returns the sorted latencies per call in seconds.
+    """
+    number = 1
+    while True:
+        start = timer()
+        for _ in range(number):
+            function(*args)
+        if timer() - start >= min_sample_time:
+            break
+        number *= 2
+
+    samples = []
+    deadline = timer() + min_time
+    while len(samples) < max_samples and (len(samples) < min_samples or timer() < deadline):
+        start = timer()
+        for _ in range(number):
+            function(*args)
+        samples.append((timer() - start) / number)
+    return sorted(samples)
+
+
+def run(cases, min_time):
+    """
+    Measures each case and returns a dict of results keyed by 'name[size]'. Cases that raise are reported with the
+    error instead.
+    """
+    results = {}
+    for name, size, function, args in cases:
+        key = '{}[{}]'.format(name, size)
+        try:
+            samples = measure(function, args, min_time)
+        except Exception as err:
+            results[key] = {'error': '{}: {}'.format(type(err).__name__, err)}
+            print('{:<32} {}'.format(key, results[key]['error']))
+            continue
+        p50 = percentile(samples, 0.5)
+        results[key] = {
+            'samples': len(samples),
+            'p50_us': p50 * 1e6,
+            'p95_us': percentile(samples, 0.95) * 1e6,
+            'p99_us': percentile(samples, 0.99) * 1e6,
+            'calls_per_s': 1 / p50 if p50 else float('inf'),
+            'items_per_s': size / p50 if p50 else float('inf')
+        }
+        print('{:<32} {samples:>7} {p50_us:>12.1f} {p95_us:>12.1f} {p99_us:>12.1f} {calls_per_s:>12.0f} '
+              '{items_per_s:>14.0f}'.format(key, **results[key]))
+        sys.stdout.flush()
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """
+    Returns (key, baseline p50, p50) for the cases whose median latency grew by more than threshold (0.25 = 25%)
+    since the baseline, or that fail but did not in the baseline.
+    """
+    slower = []
+    for key in sorted(results):
+        before, after = baseline.get(key), results[key]
+        if before is None or 'error' in before:
+            continue
+        if 'error' in after:
+            slower.append((key, before['p50_us'], float('nan')))
+        elif after['p50_us'] > before['p50_us'] * (1 + threshold):
+            slower.append((key, before['p50_us'], after['p50_us']))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filter', default='', help='only run the cases whose name matches this regular expression')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent measuring each case')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if any case regressed')
+    parser.add_argument('--threshold', type=float, default=0.25, help='tolerated median slowdown (default: 0.25)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, CODE_PATH)
+    # Solvers overflowing on the way to a root are expected and would only clutter the report
+    warnings.simplefilter('ignore', RuntimeWarning)
+    pattern = re.compile(args.filter)
+    cases = [case for case in list(function_cases()) + list(handler_cases()) if pattern.search(case[0])]
+
+    print('{:<32} {:>7} {:>12} {:>12} {:>12} {:>12} {:>14}'.format(
+        'case', 'samples', 'p50 us', 'p95 us', 'p99 us', 'calls/s', 'items/s'))
+    results = run(cases, args.min_time)
+
+    if args.save_baseline:
+        baseline = {}
+        if args.filter and os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print('Saved the baseline to {}'.format(args.baseline))
+
+    if args.check:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        slower = regressions(results, baseline, args.threshold)
+        for key, before, after in slower:
+            print('REGRESSION {:<32} p50 {:.1f} us -> {:.1f} us'.format(key, before, after))
+        if slower:
+            sys.exit(1)
+        print('No regression beyond {:.0%} of the baseline'.format(args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Command line runner streaming a CSV or JSONL file of scenarios through a handler. Requires Python 3.
+#
+# Rows are read in fixed-size chunks, each chunk is validated and evaluated as one batch request, and its results are
+# written out before the next chunk is read, so memory stays flat whatever the size of the file. With --processes,
+# chunks are evaluated in parallel by worker processes, a bounded number at a time, and still written in input order.
+#
+# Each output row is the input row plus a 'result' and an 'error' column (CSV) or entry (JSONL).
+#
+# Usage: python bulk_runner.py FUNCTION INPUT OUTPUT [--format csv|jsonl] [--chunk-size N] [--processes N]
+# INPUT and OUTPUT may be '-' for stdin and stdout, in which case --format is required.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import lambda_handlers
+
+
+def parse_number(text):
+    """
+    Converts a CSV cell to an int or a float, or returns it unchanged if it is not a number.
+    """
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def read_rows(input_file, file_format):
+    """
+    Returns the column names of a CSV file (None for JSONL) and an iterator over its scenarios, one dict at a time.
+    CSV cells are parsed as numbers and empty cells are omitted.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(input_file)
+        rows = (dict((name, parse_number(value)) for name, value in row.items() if value != '') for row in reader)
+        return reader.fieldnames, rows
+    return None, (json.loads(line) for line in input_file if line.strip())
+
+
+def chunked(rows, chunk_size):
+    """
+    Yields lists of at most chunk_size consecutive rows.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def evaluate_chunk(function, rows):
+    """
+    Evaluates a chunk of rows as one batch request to the handler of function. Returns one response dict per row.
+    """
+    response = getattr(lambda_handlers, function + '_handler')({'batch': rows}, None)
+    return response.get('results') or [{'error': response.get('error')}] * len(rows)
+
+
+def evaluate_chunks(function, chunks, processes):
+    """
+    Yields (rows, results) for every chunk in input order, evaluating up to twice as many chunks as there are
+    processes ahead of the one being written.
+    """
+    if processes <= 1:
+        for rows in chunks:
+            yield rows, evaluate_chunk(function, rows)
+        return
+
+    with ProcessPoolExecutor(processes) as executor:
+        pending = deque()
+        for rows in chunks:
+            pending.append((rows, executor.submit(evaluate_chunk, function, rows)))
+            if len(pending) >= 2 * processes:
+                rows, future = pending.popleft()
+                yield rows, future.result()
+        while pending:
+            rows, future = pending.popleft()
+            yield rows, future.result()
+
+
+class CsvWriter(object):
+    """
+    Writes output rows as CSV: the input columns followed by 'result' and 'error'.
+    """
+    def __init__(self, output_file, fieldnames):
+        self.writer = csv.DictWriter(output_file, list(fieldnames or []) + ['result', 'error'], extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, row, response):
+        result = response.get('result')
+        output = dict(row)
+        output['result'] = json.dumps(result) if isinstance(result, (dict, list)) else result
+        output['error'] = response.get('error')
+        self.writer.writerow(output)
+
+
+class JsonLinesWriter(object):
+    """
+    Writes output rows as JSON lines.
+    """
+    def __init__(self, output_file):
+        self.output_file = output_file
+
+    def write(self, row, response):
+        output = dict(row)
+        output.update(response)
+        self.output_file.write(json.dumps(output, default=float) + '\n')
+
+
+def run(function, input_file, output_file, file_format, chunk_size=10000, processes=1):
+    """
+    Streams the scenarios of input_file through the handler of function into output_file.
+    :return: Dict with the number of rows and of rows with an error
+    """
+    if not hasattr(lambda_handlers, function + '_handler'):
+        raise ValueError("No handler for function '{}'".format(function))
+
+    fieldnames, rows = read_rows(input_file, file_format)
+    writer = CsvWriter(output_file, fieldnames) if file_format == 'csv' else JsonLinesWriter(output_file)
+    counts = {'rows': 0, 'errors': 0}
+    chunks = chunked(rows, chunk_size)
+    for rows, results in evaluate_chunks(function, chunks, processes):
+        for row, response in zip(rows, results):
+            writer.write(row, response)
+            counts['errors'] += 'error' in response
+        counts['rows'] += len(rows)
+        output_file.flush()
+    return counts
+
+
+def file_format_of(path, file_format):
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.csv', '.jsonl'):
+        return extension[1:]
+    raise ValueError('Cannot tell the format of {}, pass --format'.format(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a CSV or JSONL file of scenarios through a handler')
+    parser.add_argument('function', help='function to evaluate, e.g. pmt')
+    parser.add_argument('input', help="CSV or JSONL file of scenarios, '-' for stdin")
+    parser.add_argument('output', help="file to write the results to, '-' for stdout")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='format of input and output (default: from input)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows validated and evaluated together')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes evaluating chunks in parallel')
+    args = parser.parse_args()
+
+    file_format = file_format_of(args.input, args.format)
+    input_file = sys.stdin if args.input == '-' else open(args.input, newline='')
+    output_file = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    start = time.time()
+    try:
+        counts = run(args.function, input_file, output_file, file_format, args.chunk_size, args.processes)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    elapsed = time.time() - start
+    sys.stderr.write('{} rows, {} errors in {:.1f} s ({:.0f} rows/s)\n'.format(
+        counts['rows'], counts['errors'], elapsed, counts['rows'] / elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Size-bounded LRU cache with a time to live, kept for the life of a warm container
+
+import os
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+# Returned by LRUCache.get for keys without a live entry
+MISSING = object()
+
+
+class LRUCache(object):
+    """
+    Least recently used cache of at most max_size entries, each expiring ttl seconds after it was stored.
+    Given a weigh function, max_size bounds the total weight of the values instead of their number.
+    Counts hits, misses, evictions and expirations since it was created.
+    """
+    def __init__(self, max_size, ttl, weigh=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.weigh = weigh
+        self.weight = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Returns the value stored for key, or MISSING if there is none or it expired.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            expires_at, value, weight = entry
+            if timer() < expires_at:
+                # re-inserting marks the entry as most recently used
+                self.entries[key] = entry
+                self.hits += 1
+                return value
+            self.weight -= weight
+            self.expirations += 1
+        self.misses += 1
+        return MISSING
+
+    def put(self, key, value):
+        """
+        Stores value for key, evicting the least recently used entries beyond max_size. Returns the number evicted.
+        """
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.weight -= previous[2]
+        weight = self.weigh(value) if self.weigh is not None else 1
+        self.entries[key] = (timer() + self.ttl, value, weight)
+        self.weight += weight
+        evicted = 0
+        while self.weight > self.max_size:
+            self.weight -= self.entries.popitem(last=False)[1][2]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def stats(self):
+        """
+        Returns the counters and current size of the cache.
+        """
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+def from_environment():
+    """
+    Returns the cache configured by the RESULT_CACHE_SIZE (entries, default 0 meaning disabled) and
+    RESULT_CACHE_TTL (seconds, default 300) environment variables, or None if caching is disabled.
+    """
+    max_size = int(os.getenv('RESULT_CACHE_SIZE', '0'))
+    if max_size <= 0:
+        return None
+    return LRUCache(max_size, float(os.getenv('RESULT_CACHE_TTL', '300')))
@@ -1,31 +1,778 @@
-# Additional financial functions not already provided by numpy
+# Financial functions: the time value of money functions NumPy used to provide, and additional ones it never did
 
+from __future__ import division
+import copy
 import datetime
-from scipy import optimize
+import math
+import numbers
+from functools import reduce
+
+import cache_helper
+
+# NumPy and SciPy are imported by the functions using them, so that scalar calls never pay for importing them
+
+# Day count conventions of the functions taking dates: actual days over 365 or 360, 30/360 bond basis, and actual
+# days in each calendar year over that year's length
+DAY_COUNTS = ('ACT/365F', 'ACT/360', '30/360', 'ACT/ACT ISDA')
+
+# Year fractions of the schedules most recently converted, keyed by the identity of their dates and the day count.
+# Each entry holds a copy of the dates and the years, so the cache is bounded by their total number of elements
+# (about 16 MB of arrays) and entries expire after five minutes.
+__year_fractions_cache = cache_helper.LRUCache(2000000, 300, weigh=lambda entry: len(entry[0]) + len(entry[1]))
 
 def fvschedule(principal, schedule=[]):
     """
-    Calculates future value with a variable interest rate schedule.
+    Calculates future value with a variable interest rate schedule, given as a list, a NumPy array or any column
+    supporting the buffer protocol.
     """
     return reduce(lambda x, y: x + (x * y), schedule, principal)
 
-def xnpv(rate, values=[], dates=[]):
+def fvschedule_many(principal, schedule, path=False):
+    """
+    Vectorized fvschedule for many accounts at once. principal is a number or an array of n principals; schedule is
+    one schedule of m rates shared by all accounts, or an n x m array with a schedule per account.
+    Returns the future values (an array of n, or a float), or with path=True the balance at the end of every period
+    (an n x m array, or an array of m).
+    """
+    import numpy
+    principal = numpy.asarray(principal, dtype=float)
+    growth = numpy.add(schedule, 1.0)
+    if not path:
+        future_values = principal * numpy.prod(growth, axis=-1)
+        return future_values if future_values.ndim else float(future_values)
+
+    numpy.cumprod(growth, axis=-1, out=growth)
+    # balances of a single shared schedule for many principals do not fit in the schedule's array
+    in_place = principal.ndim == 0 or growth.ndim > 1
+    return numpy.multiply(growth, principal[..., numpy.newaxis], out=growth if in_place else None)
+
+__epoch_ordinal = datetime.date(1970, 1, 1).toordinal()
+
+def __days(dates):
+    """
+    Converts dates to an int64 array of days since the epoch. Arrays of datetime64[D], and integer arrays or buffers
+    of days since the epoch (such as the data of an Arrow date32 column), are used without copying; anything else
+    (date objects, ISO strings, datetime64 of other units) is converted.
+    """
+    import numpy
+    if isinstance(dates, (list, tuple)):
+        try:
+            # NumPy converts date objects one by one through slow paths; their ordinals are much cheaper to collect
+            return numpy.array([date.toordinal() for date in dates], dtype=numpy.int64) - __epoch_ordinal
+        except AttributeError:
+            return numpy.asarray(dates, dtype='datetime64[D]').view(numpy.int64)
+    days = numpy.asarray(dates)
+    if days.dtype.kind in 'iu':
+        return days
+    if days.dtype.kind != 'M':
+        days = numpy.asarray(dates, dtype='datetime64[D]')
+    elif days.dtype != numpy.dtype('datetime64[D]'):
+        days = days.astype('datetime64[D]')
+    return days.view(numpy.int64)
+
+def __civil_dates(days):
+    """
+    Splits days since the epoch into arrays of years, months (1 to 12) and days of the month (1 to 31).
+    """
+    import numpy
+    dates = numpy.asarray(days).astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]')
+    day_of_month = (dates - months.astype('datetime64[D]')).view(numpy.int64) + 1
+    month = (months - years.astype('datetime64[M]')).view(numpy.int64) + 1
+    return years.view(numpy.int64) + 1970, month, day_of_month
+
+def __isda_years(days):
+    """
+    Splits days since the epoch into whole years since the epoch and the fraction of their calendar year elapsed,
+    each year counting its actual number of days.
+    """
+    import numpy
+    years = numpy.asarray(days).astype('datetime64[D]').astype('datetime64[Y]')
+    year_start = years.astype('datetime64[D]').view(numpy.int64)
+    year_end = (years + 1).astype('datetime64[D]').view(numpy.int64)
+    return years.view(numpy.int64), (days - year_start) / (year_end - year_start)
+
+def __year_fractions(days, start, day_count):
+    """
+    Years from start to days (arrays of days since the epoch that broadcast together) under a day count convention.
+    """
+    import numpy
+    if day_count in ('ACT/365F', 'ACT/360'):
+        years = numpy.subtract(days, start, dtype=float)
+        years /= 365.0 if day_count == 'ACT/365F' else 360.0
+        return years
+    if day_count == 'ACT/ACT ISDA':
+        end_year, end_fraction = __isda_years(days)
+        start_year, start_fraction = __isda_years(start)
+        return (end_year - start_year) + (end_fraction - start_fraction)
+    if day_count == '30/360':
+        end_year, end_month, end_day = __civil_dates(days)
+        start_year, start_month, start_day = __civil_dates(start)
+        start_day = numpy.minimum(start_day, 30)
+        end_day = numpy.where((end_day == 31) & (start_day == 30), 30, end_day)
+        return (360 * (end_year - start_year) + 30 * (end_month - start_month) + (end_day - start_day)) / 360.0
+    raise ValueError('day_count must be one of {}'.format(', '.join(DAY_COUNTS)))
+
+def __same_dates(snapshot, dates):
+    import numpy
+    if isinstance(dates, numpy.ndarray):
+        return isinstance(snapshot, numpy.ndarray) and numpy.array_equal(snapshot, dates)
+    return type(snapshot) is type(dates) and snapshot == dates
+
+def __schedule_years(dates, day_count):
+    """
+    Read-only array of years elapsed since the first date of a schedule, checked to be in chronological order.
+    Schedules given as lists, tuples or NumPy arrays are converted once and looked up by identity afterwards, so
+    revaluing a schedule at many rates or iterating on its rate of return skips the date arithmetic. A copy of the
+    dates is kept along with the years, so a schedule changed in place is converted again.
+    """
+    import numpy
+    if day_count not in DAY_COUNTS:
+        raise ValueError('day_count must be one of {}'.format(', '.join(DAY_COUNTS)))
+    cacheable = isinstance(dates, (list, tuple, numpy.ndarray))
+    key = (id(dates), day_count)
+    if cacheable:
+        entry = __year_fractions_cache.get(key)
+        if entry is not cache_helper.MISSING and __same_dates(entry[0], dates):
+            return entry[1]
+
+    days = __days(dates)
+    if numpy.any(days[1:] < days[:-1]):
+        raise ValueError('dates must be in chronological order')
+    years = __year_fractions(days, days[0], day_count) if len(days) else numpy.zeros(0)
+    years.flags.writeable = False
+    if cacheable:
+        __year_fractions_cache.put(key, (copy.copy(dates), years))
+    return years
+
+def __schedule(values, dates, day_count='ACT/365F'):
+    """
+    Converts a cash flow schedule to arrays of values and of years elapsed since the first date. Values already held
+    in float64 arrays or buffers are not copied, and dates are checked to be in chronological order in one pass.
+    """
+    import numpy
+    values = numpy.asarray(values, dtype=float)
+    years = __schedule_years(dates, day_count)
+    if len(values) != len(years):
+        raise ValueError('values and dates must be the same length')
+    return values, years
+
+def __xnpv(rate, values, years):
+    """
+    Net Present Value of values discounted over the given (possibly fractional) numbers of periods.
+    """
+    import numpy
+    return numpy.sum(values / (1 + rate) ** years)
+
+def __xnpv_derivative(rate, values, years):
+    """
+    Derivative with respect to rate of __xnpv.
+    """
+    import numpy
+    return numpy.sum(-years * values / (1 + rate) ** (years + 1))
+
+def xnpv(rate, values=[], dates=[], day_count='ACT/365F'):
+    """
+    Calculates the Net Present Value for a schedule of cash flows that is not necessarily periodic, counting years
+    between dates with day_count, one of DAY_COUNTS.
+    """
+    values, years = __schedule(values, dates, day_count)
+    return float(__xnpv(rate, values, years))
+
+def __npv_analytics(rate, values, times):
+    """
+    NPV and its sensitivities to rate, from a single computation of the discount factors. Durations are in the unit
+    of times.
+    """
+    import numpy
+    present_values = values * (1 + rate) ** -times
+    npv = float(present_values.sum())
+    first_moment = float(numpy.dot(times, present_values))
+    second_moment = float(numpy.dot(times * (times + 1), present_values))
+    growth = 1 + rate
+    return {
+        'npv': npv,
+        'macaulay_duration': __divide(first_moment, npv),
+        'modified_duration': __divide(first_moment, npv * growth),
+        'convexity': __divide(second_moment, npv * growth ** 2),
+        # change in NPV for a one basis point fall in rate
+        'dv01': __divide(first_moment, growth) * 0.0001
+    }
+
+def xnpv_analytics(rate, values=[], dates=[], day_count='ACT/365F'):
+    """
+    Calculates the Net Present Value of a schedule of cash flows that is not necessarily periodic together with its
+    Macaulay and modified durations (in years of day_count), convexity and DV01.
+    """
+    values, years = __schedule(values, dates, day_count)
+    return __npv_analytics(rate, values, years)
+
+def xirr(values=[], dates=[], guess=0.1, day_count='ACT/365F'):
+    """
+    Returns the internal rate of return for a schedule of cash flows that is not necessarily periodic, counting years
+    between dates with day_count, one of DAY_COUNTS.
+    """
+    from scipy import optimize
+    values, years = __schedule(values, dates, day_count)
+    return optimize.newton(lambda r: __xnpv(r, values, years), guess,
+                           fprime=lambda r: __xnpv_derivative(r, values, years))
+
+# Rates scanned for a sign change when a root has to be bracketed
+__bracket_rates = (-0.9999, -0.999, -0.99, -0.9, -0.5, -0.25, 0.0, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 100.0, 1000.0)
+
+def __bracketed_root(function):
+    """
+    Finds a rate at which function changes sign by scanning __bracket_rates and refines it with Brent's method.
+    Returns nan if no sign change is found.
+    """
+    import numpy
+    from scipy import optimize
+    with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        previous_rate = __bracket_rates[0]
+        previous_value = function(previous_rate)
+        for rate in __bracket_rates[1:]:
+            if previous_value == 0:
+                return previous_rate
+            value = function(rate)
+            if numpy.isfinite(previous_value) and numpy.isfinite(value) and (previous_value < 0) != (value < 0):
+                return optimize.brentq(function, previous_rate, rate)
+            previous_rate, previous_value = rate, value
+        return previous_rate if previous_value == 0 else numpy.nan
+
+def __nearest_bracketed_root(function):
+    """
+    Finds every rate at which function changes sign between consecutive __bracket_rates, refines each with Brent's
+    method and returns the one nearest 0, or nan if there is none.
     """
-    Calculates the Net Present Value for a schedule of cash flows that is not necessarily periodic.
+    import numpy
+    from scipy import optimize
+    with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        values = [function(rate) for rate in __bracket_rates]
+        roots = [rate for rate, value in zip(__bracket_rates, values) if value == 0]
+        for index in range(len(__bracket_rates) - 1):
+            low, high = values[index], values[index + 1]
+            if numpy.isfinite(low) and numpy.isfinite(high) and low != 0 and high != 0 and (low < 0) != (high < 0):
+                roots.append(optimize.brentq(function, __bracket_rates[index], __bracket_rates[index + 1]))
+    return min(roots, key=abs) if roots else numpy.nan
+
+def __is_root(rate, values, periods):
+    """
+    Whether the NPV of values at rate is negligible next to the discounted flows it sums, rather than rate being
+    where Newton's method stalled (as it does close to -1, where the discount factors explode).
+    """
+    import numpy
+    discounted = values * (1 + rate) ** -periods
+    return bool(numpy.abs(discounted.sum()) <= 1e-9 * numpy.abs(discounted).sum())
+
+
+def xirr_many(values, dates, offsets, guess=0.1, tol=1.48e-8, maxiter=50, day_count='ACT/365F'):
     """
-    if len(values) != len(dates):
+    Returns the internal rates of return of many schedules of cash flows at once, as an array. The schedules are laid
+    out CSR-style: schedule i is values[offsets[i]:offsets[i + 1]] paid on dates[offsets[i]:offsets[i + 1]].
+    All schedules are solved together by a vectorized Newton iteration; the ones that fail to converge are bracketed
+    and solved one at a time. Schedules without at least one positive and one negative value get nan.
+    """
+    import numpy
+    if day_count not in DAY_COUNTS:
+        raise ValueError('day_count must be one of {}'.format(', '.join(DAY_COUNTS)))
+    values = numpy.asarray(values, dtype=float)
+    days = __days(dates)
+    offsets = numpy.asarray(offsets, dtype=numpy.intp)
+    if len(values) != len(days):
         raise ValueError('values and dates must be the same length')
-    if sorted(dates) != dates:
+    if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(values) or numpy.any(offsets[1:] < offsets[:-1]):
+        raise ValueError('offsets must be non-decreasing, from 0 to the number of values')
+
+    count = len(offsets) - 1
+    lengths = offsets[1:] - offsets[:-1]
+    schedule = numpy.repeat(numpy.arange(count), lengths)
+    if numpy.any((days[1:] < days[:-1]) & (schedule[1:] == schedule[:-1])):
         raise ValueError('dates must be in chronological order')
-        
-    first_date = dates[0]
-    return sum([value / ((1 + rate) ** ((date - first_date).days/365.0)) for (value, date) in zip(values, dates)])
+    years = __year_fractions(days, days[numpy.repeat(offsets[:-1], lengths)], day_count)
+
+    has_positive = numpy.bincount(schedule, weights=values > 0, minlength=count) > 0
+    has_negative = numpy.bincount(schedule, weights=values < 0, minlength=count) > 0
+    rates = numpy.full(count, numpy.nan)
+    active = numpy.flatnonzero(has_positive & has_negative)
+    rates[active] = guess
+    unsolved = []
+
+    for _ in range(maxiter):
+        if not active.size:
+            break
+        is_active = numpy.zeros(count, dtype=bool)
+        is_active[active] = True
+        elements = is_active[schedule]
+        active_schedule = schedule[elements]
+        active_values = values[elements]
+        active_years = years[elements]
+        growth = 1 + rates[active_schedule]
+
+        # steps far from the root can overflow the discount factors; they are marked as failed below
+        with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+            discounted = active_values / growth ** active_years
+            npv = numpy.bincount(active_schedule, weights=discounted, minlength=count)[active]
+            derivative = numpy.bincount(active_schedule, weights=-active_years * discounted / growth, minlength=count)[active]
+            new_rates = rates[active] - npv / derivative
+
+        failed = ~numpy.isfinite(new_rates) | (new_rates <= -1)
+        converged = ~failed & (numpy.abs(new_rates - rates[active]) < tol)
+        rates[active] = numpy.where(failed, numpy.nan, new_rates)
+        unsolved.extend(active[failed])
+        active = active[~failed & ~converged]
+
+    unsolved.extend(active)
+    for index in unsolved:
+        start, end = offsets[index], offsets[index + 1]
+        schedule_values, schedule_years = values[start:end], years[start:end]
+        rates[index] = __bracketed_root(lambda r: __xnpv(r, schedule_values, schedule_years))
+    return rates
+
+def __irr_guess(values, periods):
+    """
+    Initial IRR guess: the rate at which the total inflow and outflow, each placed at its value-weighted average
+    period, have the same present value.
+    """
+    inflows = values > 0
+    received = values[inflows].sum()
+    paid = -values[~inflows].sum()
+    if received <= 0 or paid <= 0:
+        return 0.1
+    span = (values[inflows] * periods[inflows]).sum() / received + (values[~inflows] * periods[~inflows]).sum() / paid
+    # inflows placed before the outflows make the span negative and the guess tend to -1, where Newton stalls
+    if not span > 0:
+        return 0.1
+    guess = (received / paid) ** (1.0 / span) - 1
+    return guess if -1 < guess < float('inf') else 0.1
+
+def irr(values, guess=None, tol=1e-12, maxiter=50):
+    """
+    Returns the internal rate of return for a periodic schedule of cash flows, or nan if there is none.
+    Values whose signs change once (ignoring zeros) have a single rate of return, found by Newton's method with an
+    analytic derivative from the guess; if it steps out of range or stops short of a root, the root is bracketed and
+    found with Brent's method. Values whose signs change more than once may have several rates of return; the one
+    nearest 0 among those bracketed by __bracket_rates is returned, as numpy.irr picks the root nearest 0.
+    """
+    import numpy
+    values = numpy.asarray(values, dtype=float)
+    periods = numpy.arange(len(values), dtype=float)
+    if not (numpy.any(values > 0) and numpy.any(values < 0)):
+        return numpy.nan
+
+    function = lambda r: __xnpv(r, values, periods)
+    signs = numpy.sign(values[values != 0])
+    if numpy.count_nonzero(signs[1:] != signs[:-1]) > 1:
+        return float(__nearest_bracketed_root(function))
+
+    # steps far from the root can overflow the discount factors; they are rejected below
+    with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        rate = __irr_guess(values, periods) if guess is None else guess
+        for _ in range(maxiter):
+            derivative = __xnpv_derivative(rate, values, periods)
+            if derivative == 0 or not numpy.isfinite(derivative):
+                break
+            new_rate = rate - function(rate) / derivative
+            if not numpy.isfinite(new_rate) or new_rate <= -1:
+                break
+            if abs(new_rate - rate) < tol:
+                if __is_root(new_rate, values, periods):
+                    return float(new_rate)
+                break
+            rate = new_rate
+
+        return float(__bracketed_root(function))
+
+def __window_roots(windows, times, tol, maxiter, guess=None):
+    """
+    Internal rates of return of the cash flows in each row of windows, paid at times (a row per window, or one row
+    shared by all of them). All rows are solved together by a vectorized Newton iteration started from guess, or from
+    __irr_guess of each row without one; the rows it fails on take the lowest root bracketed by __bracket_rates.
+    Rows without both a positive and a negative value get nan.
+    """
+    import numpy
+    times = numpy.broadcast_to(times, windows.shape)
+    rates = numpy.full(len(windows), numpy.nan)
+
+    # steps far from the root can overflow the discount factors; they are marked as failed below
+    with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        inflows = numpy.where(windows > 0, windows, 0)
+        outflows = windows - inflows
+        received = inflows.sum(axis=1)
+        paid = -outflows.sum(axis=1)
+        span = (inflows * times).sum(axis=1) / received + (outflows * times).sum(axis=1) / paid
+        guesses = (received / paid) ** (1 / span) - 1
+        guesses = numpy.where((span > 0) & (guesses > -1) & numpy.isfinite(guesses), guesses, 0.1)
+        active = numpy.flatnonzero((received > 0) & (paid > 0))
+        rates[active] = guesses[active] if guess is None else guess
+        unsolved = []
+
+        for _ in range(maxiter):
+            if not active.size:
+                break
+            active_windows = windows[active]
+            active_times = times[active]
+            growth = 1 + rates[active]
+            discounted = active_windows * growth[:, numpy.newaxis] ** -active_times
+            npv = discounted.sum(axis=1)
+            derivative = -(active_times * discounted).sum(axis=1) / growth
+            new_rates = rates[active] - npv / derivative
+
+            failed = ~numpy.isfinite(new_rates) | (new_rates <= -1)
+            converged = ~failed & (numpy.abs(new_rates - rates[active]) < tol)
+            # a step below tol only solves the row if the NPV at the new rate is negligible, as in __is_root
+            if converged.any():
+                residuals = active_windows[converged] * (1 + new_rates[converged, numpy.newaxis]) ** \
+                    -active_times[converged]
+                stalled = numpy.zeros_like(converged)
+                stalled[converged] = ~(numpy.abs(residuals.sum(axis=1)) <= 1e-9 * numpy.abs(residuals).sum(axis=1))
+                failed |= stalled
+                converged &= ~stalled
+            rates[active] = numpy.where(failed, numpy.nan, new_rates)
+            unsolved.extend(active[failed])
+            active = active[~failed & ~converged]
+
+    unsolved = numpy.array(unsolved + list(active), dtype=numpy.intp)
+    if not unsolved.size:
+        return rates
+
+    # scan __bracket_rates for every unsolved row at once, then bisect the first bracket of all rows together
+    bracket_rates = numpy.array(__bracket_rates)
+    unsolved_windows = windows[unsolved]
+    unsolved_times = times[unsolved]
+    with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        discount = (1 + bracket_rates)[numpy.newaxis, :, numpy.newaxis] ** -unsolved_times[:, numpy.newaxis, :]
+        npvs = (unsolved_windows[:, numpy.newaxis, :] * discount).sum(axis=2)
+        finite = numpy.isfinite(npvs)
+        zero = npvs == 0
+        events = zero.copy()
+        events[:, :-1] |= finite[:, :-1] & finite[:, 1:] & ((npvs[:, :-1] < 0) != (npvs[:, 1:] < 0))
+        rows = numpy.arange(len(unsolved))
+        first_events = numpy.argmax(events, axis=1)
+        found = events[rows, first_events]
+        at_zero = zero[rows, first_events]
+        rates[unsolved] = numpy.where(found & at_zero, bracket_rates[first_events], numpy.nan)
+
+        bisected = found & ~at_zero
+        low = bracket_rates[first_events[bisected]]
+        high = bracket_rates[first_events[bisected] + 1]
+        low_negative = npvs[rows[bisected], first_events[bisected]] < 0
+        bisected_windows, bisected_times = unsolved_windows[bisected], unsolved_times[bisected]
+        for _ in range(100):
+            if not low.size or numpy.all(high - low <= 2e-12 + 4e-16 * numpy.abs(low)):
+                break
+            middle = (low + high) / 2
+            npv = (bisected_windows * (1 + middle[:, numpy.newaxis]) ** -bisected_times).sum(axis=1)
+            same_sign = (npv < 0) == low_negative
+            low = numpy.where(same_sign, middle, low)
+            high = numpy.where(same_sign, high, middle)
+        rates[unsolved[bisected]] = (low + high) / 2
+    return rates
+
+def __windows(values, window):
+    """
+    Read-only view of every run of window consecutive values as the rows of a 2-D array, without copying them.
+    """
+    import numpy
+    if not 1 <= window <= len(values):
+        raise ValueError('window must be between 1 and the number of values')
+    stride = values.strides[0]
+    return numpy.lib.stride_tricks.as_strided(values, (len(values) - window + 1, window), (stride, stride))
+
+def rolling_irr(values, window, tol=1e-12, maxiter=8):
+    """
+    Returns the internal rate of return of every window of window consecutive values of a periodic schedule of cash
+    flows, as an array: element i is the IRR of values[i:i + window], or nan if it has none.
+    Like irr, Newton's method starts every window from __irr_guess. Windows it has not solved within maxiter steps
+    get their lowest root bracketed by __bracket_rates, found by bisection, which is cheaper than letting a few slow
+    windows keep the whole vectorized iteration going.
+    """
+    import numpy
+    values = numpy.asarray(values, dtype=float)
+    return __window_roots(__windows(values, window), numpy.arange(window, dtype=float), tol, maxiter)
+
+def rolling_xirr(values, dates, window, tol=1.48e-8, maxiter=8, day_count='ACT/365F', guess=0.1):
+    """
+    Returns the internal rate of return of every window of window consecutive cash flows of a schedule that is not
+    necessarily periodic, as an array: element i is the XIRR of values[i:i + window] paid on dates[i:i + window], or
+    nan if it has none.
+    Like xirr, Newton's method starts every window from guess, so windows whose cash flows change sign more than
+    once get the same root as xirr whenever it converges within maxiter steps; the others get their lowest root
+    bracketed by __bracket_rates.
+    """
+    values, years = __schedule(values, dates, day_count)
+    if day_count == '30/360':
+        # 30/360 fractions depend on the day of month of the start date, so each window counts from its own
+        day_windows = __windows(__days(dates), window)
+        year_windows = __year_fractions(day_windows, day_windows[:, :1], day_count)
+    else:
+        year_windows = __windows(years, window)
+        year_windows = year_windows - year_windows[:, :1]
+    return __window_roots(__windows(values, window), year_windows, tol, maxiter, guess)
+
+def __is_scalar(*args):
+    """
+    Whether all the arguments are plain numbers, in which case the scalar fast paths apply.
+    """
+    return all(isinstance(arg, numbers.Number) for arg in args)
+
+def __broadcast(*args):
+    """
+    Converts the arguments to float arrays broadcast against each other.
+    """
+    import numpy
+    return numpy.broadcast_arrays(*[numpy.asarray(arg, dtype=float) for arg in args])
+
+def __divide(numerator, denominator):
+    """
+    Scalar division returning inf or nan on division by zero, like NumPy, instead of raising ZeroDivisionError.
+    """
+    if denominator == 0:
+        if numerator == 0 or numerator != numerator:
+            return float('nan')
+        return math.copysign(float('inf'), numerator) * math.copysign(1, denominator)
+    return numerator / denominator
+
+def __power(base, exponent):
+    """
+    Scalar power returning nan instead of a complex number (or of raising ValueError, as Python 2 does) and inf
+    instead of raising on overflow, like NumPy.
+    """
+    try:
+        result = float(base) ** exponent
+    except (OverflowError, ZeroDivisionError):
+        return float('inf')
+    except ValueError:
+        return float('nan')
+    return float('nan') if isinstance(result, complex) else result
+
+def __log(value):
+    """
+    Scalar natural logarithm returning -inf or nan for values out of its domain, like NumPy.
+    """
+    if value > 0:
+        return math.log(value)
+    return float('-inf') if value == 0 else float('nan')
+
+def __scalar_annuity_factor(rate, nper, when, growth):
+    return nper if rate == 0 else (1 + rate * when) * (growth - 1) / rate
+
+def __array_annuity_factor(rate, nper, when, growth):
+    import numpy
+    zero = rate == 0
+    masked_rate = numpy.where(zero, 1, rate)
+    return numpy.where(zero, nper, (1 + masked_rate * when) * (growth - 1) / masked_rate)
+
+def __scalar_fv(rate, nper, pmt, pv, when):
+    growth = __power(1 + rate, nper)
+    return -(pv * growth + pmt * __scalar_annuity_factor(rate, nper, when, growth))
+
+def __array_fv(rate, nper, pmt, pv, when):
+    growth = (1 + rate) ** nper
+    return -(pv * growth + pmt * __array_annuity_factor(rate, nper, when, growth))
+
+def __scalar_pmt(rate, nper, pv, fv, when):
+    growth = __power(1 + rate, nper)
+    return __divide(-(fv + pv * growth), __scalar_annuity_factor(rate, nper, when, growth))
+
+def __array_pmt(rate, nper, pv, fv, when):
+    growth = (1 + rate) ** nper
+    return -(fv + pv * growth) / __array_annuity_factor(rate, nper, when, growth)
+
+def __scalar_ipmt(rate, per, nper, pv, fv, when):
+    if per < 1:
+        return float('nan')
+    if when == 1 and per == 1:
+        return 0.0
+    interest = __scalar_fv(rate, per - 1, __scalar_pmt(rate, nper, pv, fv, when), pv, when) * rate
+    return __divide(interest, 1 + rate) if when == 1 else interest
+
+def __array_ipmt(rate, per, nper, pv, fv, when):
+    import numpy
+    interest = __array_fv(rate, per - 1, __array_pmt(rate, nper, pv, fv, when), pv, when) * rate
+    interest = numpy.where(when == 1, interest / (1 + rate), interest)
+    interest = numpy.where((when == 1) & (per == 1), 0, interest)
+    return numpy.where(per < 1, numpy.nan, interest)
+
+def __scalar_rate_step(rate, nper, pmt, pv, fv, when):
+    """
+    Newton step for rate: the annuity equation divided by its derivative with respect to rate.
+    """
+    growth = __power(1 + rate, nper)
+    previous_growth = __power(1 + rate, nper - 1)
+    value = fv + growth * pv + __divide(pmt * (growth - 1) * (rate * when + 1), rate)
+    derivative = (nper * previous_growth * pv - __divide(pmt * (growth - 1) * (rate * when + 1), rate ** 2)
+                  + __divide(nper * pmt * previous_growth * (rate * when + 1), rate)
+                  + __divide(pmt * (growth - 1) * when, rate))
+    return __divide(value, derivative)
+
+def __array_rate_step(rate, nper, pmt, pv, fv, when):
+    growth = (1 + rate) ** nper
+    previous_growth = (1 + rate) ** (nper - 1)
+    value = fv + growth * pv + pmt * (growth - 1) * (rate * when + 1) / rate
+    derivative = (nper * previous_growth * pv - pmt * (growth - 1) * (rate * when + 1) / rate ** 2
+                  + nper * pmt * previous_growth * (rate * when + 1) / rate
+                  + pmt * (growth - 1) * when / rate)
+    return value / derivative
+
+def fv(rate, nper, pmt, pv, when=0):
+    """
+    Returns the future value of an investment with constant periodic payments and a constant interest rate.
+    Payments are due at the end (when=0) or the beginning (when=1) of each period.
+    """
+    if __is_scalar(rate, nper, pmt, pv, when):
+        return __scalar_fv(rate, nper, pmt, pv, when)
+    return __array_fv(*__broadcast(rate, nper, pmt, pv, when))
+
+def pv(rate, nper, pmt, fv=0, when=0):
+    """
+    Returns the present value of an investment with constant periodic payments and a constant interest rate.
+    """
+    if __is_scalar(rate, nper, pmt, fv, when):
+        growth = __power(1 + rate, nper)
+        return __divide(-(fv + pmt * __scalar_annuity_factor(rate, nper, when, growth)), growth)
+    rate, nper, pmt, fv, when = __broadcast(rate, nper, pmt, fv, when)
+    growth = (1 + rate) ** nper
+    return -(fv + pmt * __array_annuity_factor(rate, nper, when, growth)) / growth
+
+def pmt(rate, nper, pv, fv=0, when=0):
+    """
+    Returns the constant periodic payment, principal plus interest, paying off a loan at a constant interest rate.
+    """
+    if __is_scalar(rate, nper, pv, fv, when):
+        return __scalar_pmt(rate, nper, pv, fv, when)
+    return __array_pmt(*__broadcast(rate, nper, pv, fv, when))
+
+def ipmt(rate, per, nper, pv, fv=0, when=0):
+    """
+    Returns the interest portion of the payment for period per (starting at 1) of a loan.
+    """
+    if __is_scalar(rate, per, nper, pv, fv, when):
+        return __scalar_ipmt(rate, per, nper, pv, fv, when)
+    return __array_ipmt(*__broadcast(rate, per, nper, pv, fv, when))
+
+def ppmt(rate, per, nper, pv, fv=0, when=0):
+    """
+    Returns the principal portion of the payment for period per (starting at 1) of a loan.
+    """
+    if __is_scalar(rate, per, nper, pv, fv, when):
+        return __scalar_pmt(rate, nper, pv, fv, when) - __scalar_ipmt(rate, per, nper, pv, fv, when)
+    rate, per, nper, pv, fv, when = __broadcast(rate, per, nper, pv, fv, when)
+    return __array_pmt(rate, nper, pv, fv, when) - __array_ipmt(rate, per, nper, pv, fv, when)
+
+def nper(rate, pmt, pv, fv=0, when=0):
+    """
+    Returns the number of constant periodic payments needed to pay off a loan at a constant interest rate.
+    """
+    if __is_scalar(rate, pmt, pv, fv, when):
+        if rate == 0:
+            return __divide(-(fv + pv), pmt)
+        z = pmt * (1 + rate * when) / rate
+        return __divide(__log(__divide(z - fv, pv + z)), __log(1 + rate))
+
+    import numpy
+    rate, pmt, pv, fv, when = __broadcast(rate, pmt, pv, fv, when)
+    zero = rate == 0
+    masked_rate = numpy.where(zero, 1, rate)
+    z = pmt * (1 + masked_rate * when) / masked_rate
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where(zero, -(fv + pv) / pmt, numpy.log((z - fv) / (pv + z)) / numpy.log(1 + masked_rate))
+
+def rate(nper, pmt, pv, fv=0, when=0, guess=0.1, tol=1e-6, maxiter=100):
+    """
+    Returns the interest rate per period of an annuity, solved by Newton's method, or nan if it does not converge
+    within maxiter iterations.
+    """
+    if __is_scalar(nper, pmt, pv, fv, when, guess):
+        current = guess
+        for _ in range(maxiter):
+            step = __scalar_rate_step(current, nper, pmt, pv, fv, when)
+            if abs(step) < tol:
+                return current - step
+            current -= step
+        return float('nan')
+
+    import numpy
+    nper, pmt, pv, fv, when, guess = __broadcast(nper, pmt, pv, fv, when, guess)
+    current = guess.copy()
+    converged = numpy.zeros(current.shape, dtype=bool)
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(maxiter):
+            active = ~converged
+            if not active.any():
+                break
+            step = __array_rate_step(current[active], nper[active], pmt[active], pv[active], fv[active], when[active])
+            current[active] -= step
+            converged[active] = numpy.abs(step) < tol
+    return numpy.where(converged, current, numpy.nan)
+
+def amortization(rate, nper, pv, fv=0, when=0, start_period=1, end_period=None):
+    """
+    Returns the amortization schedule of a loan for periods start_period to end_period (default nper) inclusive, as a
+    dict of arrays: period, payment, interest, principal and the balance remaining at the end of each period.
+    """
+    import numpy
+    if nper != int(nper) or nper < 1:
+        raise ValueError('nper must be a positive whole number of periods')
+    if end_period is None:
+        end_period = nper
+    if not 1 <= start_period <= end_period <= nper:
+        raise ValueError('periods must satisfy 1 <= start_period <= end_period <= nper')
+
+    period = numpy.arange(int(start_period), int(end_period) + 1)
+    payment = numpy.full(period.shape, __scalar_pmt(rate, nper, pv, fv, when))
+    interest = __array_ipmt(*__broadcast(rate, period, nper, pv, fv, when))
+    # value of the loan at the end of each period, less the interest accrued since a payment due at its beginning
+    balance = -__array_fv(*__broadcast(rate, period, payment, pv, when))
+    if when == 1:
+        balance = balance / (1 + rate)
+    return {
+        'period': period,
+        'payment': payment,
+        'interest': interest,
+        'principal': payment - interest,
+        'balance': balance
+    }
+
+def amortization_chunks(rate, nper, pv, fv=0, when=0, chunk_size=1000):
+    """
+    Yields the amortization schedule of a loan in consecutive chunks of at most chunk_size periods, so that very long
+    schedules never need to be held in memory at once.
+    """
+    for start_period in range(1, int(nper) + 1, chunk_size):
+        yield amortization(rate, nper, pv, fv, when, start_period, min(start_period + chunk_size - 1, int(nper)))
+
+def npv(rate, values):
+    """
+    Returns the net present value of a periodic schedule of cash flows, the first of which is not discounted.
+    """
+    import numpy
+    values = numpy.asarray(values, dtype=float)
+    return float(__xnpv(rate, values, numpy.arange(len(values), dtype=float)))
+
+def npv_analytics(rate, values):
+    """
+    Returns the net present value of a periodic schedule of cash flows together with its Macaulay and modified
+    durations (in periods), convexity and DV01, as a dict.
+    """
+    import numpy
+    values = numpy.asarray(values, dtype=float)
+    return __npv_analytics(rate, values, numpy.arange(len(values), dtype=float))
 
-def xirr(values=[], dates=[], guess=0.1):
+def mirr(values, finance_rate, reinvest_rate):
     """
-    Returns the internal rate of return for a schedule of cash flows that is not necessarily periodic. 
+    Returns the modified internal rate of return for a periodic schedule of cash flows, financing outflows at
+    finance_rate and reinvesting inflows at reinvest_rate, or nan without both a positive and a negative value.
     """
-    return optimize.newton(lambda r: xnpv(r, values, dates), guess)
+    import numpy
+    values = numpy.asarray(values, dtype=float)
+    positive = values > 0
+    negative = values < 0
+    if not (positive.any() and negative.any()):
+        return float('nan')
+    numerator = abs(npv(reinvest_rate, values * positive))
+    denominator = abs(npv(finance_rate, values * negative))
+    return (numerator / denominator) ** (1 / (len(values) - 1)) * (1 + reinvest_rate) - 1
 
 def effect(nominal_rate, npery):
     """
@@ -1,14 +1,24 @@
 from __future__ import print_function
+import base64
+import numbers
 import sys
+from timeit import default_timer as timer
 import log_helper
 sys.path.append('lib')
-import numpy
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+import cache_helper
+import financial_functions
+import metrics_helper
+import npv_accumulator
+import validation_helper
 import validation_json_schemas as schemas
 
 logger = log_helper.getLogger(__name__)
 
+try:
+    __string_types = (basestring,)
+except NameError:
+    __string_types = (str,)
+
 
 def __validate_arguments(function_name, arguments_json, json_schema):
     """
@@ -18,187 +28,931 @@ def __validate_arguments(function_name, arguments_json, json_schema):
     :param json_schema:
     :return: Dict containing whether the provided json is valid and an error message if validation failed.
     """
-    try:
-        validate(arguments_json, json_schema)
+    with metrics_helper.phase('ValidationTime'):
+        err = validation_helper.find_error(arguments_json, json_schema)
+    if err is None:
         return {'isValid': True}
-    except ValidationError as err:
-        logger.error("Invalid {} request with args: {}. Exception: {}".format(function_name, arguments_json, err))
-        return {'isValid': False, 'error': err.message}
+
+    logger.error("Invalid %s request with args: %s. Exception at %s: %s", function_name,
+                 log_helper.summarize(arguments_json), '/'.join(str(part) for part in err.path), err.message)
+    return {'isValid': False, 'error': err.message}
+
+
+def __amortization(*args):
+    """
+    Amortization schedule with its columns converted to lists
+    :param args: Arguments for financial_functions.amortization
+    :return: Dict of lists: period, payment, interest, principal and balance
+    """
+    schedule = financial_functions.amortization(*args)
+    return dict((column, values.tolist()) for column, values in schedule.items())
+
+
+def __npv(rate, values, analytics=False):
+    """
+    NPV, or NPV with its durations, convexity and DV01 when analytics are requested
+    """
+    if analytics:
+        return financial_functions.npv_analytics(rate, values)
+    return financial_functions.npv(rate, values)
+
+
+def __npv_update(state, rates, start_date, append, remove):
+    """
+    Update the running NPV of a stream of cash flows
+    :param state: State returned by a previous update, or None to start a new stream
+    :param rates: Rate or list of rates of a new stream
+    :param start_date: Date the dated flows of a new stream are discounted to
+    :param append: List of flow dicts to add, each with a 'value' and a 'period' or a 'date'
+    :param remove: List of flow dicts to take out
+    :return: Dict with the 'npv' (a list for a list of rates) and the 'state' to pass to the next update
+    """
+    if state is not None:
+        accumulator = npv_accumulator.NpvAccumulator.from_dict(state)
+    else:
+        accumulator = npv_accumulator.NpvAccumulator(rates, start_date)
+    for flow in append:
+        accumulator.append(flow['value'], flow['period'] if 'period' in flow else flow['date'])
+    for flow in remove:
+        accumulator.remove(flow['value'], flow['period'] if 'period' in flow else flow['date'])
+    return {'npv': accumulator.npv(), 'state': accumulator.to_dict()}
+
+
+def __irr(values, window=None):
+    """
+    IRR, or the IRR of every window of consecutive values, with None for the windows that have none
+    """
+    if window is None:
+        return financial_functions.irr(values)
+    rates = financial_functions.rolling_irr(values, window).tolist()
+    return [rate if rate == rate else None for rate in rates]
+
+
+def __decode_values(values):
+    """
+    Cash flow values as sent: a list of numbers is returned as is, a string of base64 encoded little-endian float64
+    is decoded straight into a NumPy array, without a Python float per value
+    :param values: List of numbers or base64 string
+    :return: List of numbers or NumPy array
+    """
+    if not isinstance(values, __string_types):
+        return values
+    import numpy
+    return numpy.frombuffer(base64.b64decode(values), dtype='<f8')
+
+
+def __encode_results(function_name, results):
+    """
+    Encode the results of a batch as base64 little-endian float64, nan for the items that failed, whose errors are
+    listed apart
+    :param function_name: Name of the function used in the error message
+    :param results: List of 'result' or 'error' dicts
+    :return: Dict with the base64 'results' and the list of 'errors', each with the 'index' of its item
+    """
+    import numpy
+    values = [item.get('result', float('nan')) for item in results]
+    if any(isinstance(value, bool) or not isinstance(value, numbers.Real) for value in values):
+        return {'error': "{} results cannot be encoded as base64".format(function_name)}
+    errors = [{'index': index, 'error': item['error']} for index, item in enumerate(results) if 'error' in item]
+    encoded = base64.b64encode(numpy.asarray(values, dtype='<f8').tobytes()).decode('ascii')
+    return {'results': encoded, 'errors': errors}
+
+
+# Financial functions the handlers dispatch to, by method name
+__functions = {
+    'fv': financial_functions.fv,
+    'pv': financial_functions.pv,
+    'npv': __npv,
+    'pmt': financial_functions.pmt,
+    'ppmt': financial_functions.ppmt,
+    'irr': __irr,
+    'mirr': financial_functions.mirr,
+    'nper': financial_functions.nper,
+    'rate': financial_functions.rate,
+    'amortization': __amortization,
+    'npv_update': __npv_update
+}
+
+
+# Functions of scalar arguments whose results are cached when RESULT_CACHE_SIZE is set
+__cacheable_functions = frozenset(['fv', 'pv', 'pmt', 'ppmt', 'nper', 'rate'])
+__result_cache = cache_helper.from_environment()
+
+
+def __call_function(method, args):
+    """
+    Call a financial function with a given set of arguments, going through the result cache if it is enabled
+    :param method: Name of the financial function to call
+    :param args: Arguments for the financial function
+    :return: Dict with a 'result' entry containing the result of the function
+    """
+    logger.info("Calling %s with args: %s", method, log_helper.summarize(args))
+    cache_key = None
+    if __result_cache is not None and method in __cacheable_functions:
+        # the argument list has its defaults filled in, so equivalent requests share a key
+        cache_key = (method,) + tuple(float(arg) for arg in args)
+        result = __result_cache.get(cache_key)
+        if result is not cache_helper.MISSING:
+            metrics_helper.count('CacheHits')
+            return {'result': result}
+        metrics_helper.count('CacheMisses')
+
+    with metrics_helper.phase('ComputeTime'):
+        result = __functions[method](*args)
+
+    if cache_key is not None:
+        evicted = __result_cache.put(cache_key, result)
+        if evicted:
+            metrics_helper.count('CacheEvictions', evicted)
+    return {'result': result}
+
+
+def __is_batch(request):
+    """
+    Whether the request is a batch request, i.e. carries a 'batch' entry instead of a single set of arguments
+    :param request: Dict containing the request
+    :return: True if the request should be evaluated as a batch
+    """
+    return isinstance(request, dict) and 'batch' in request
+
+
+def __batch_items(batch):
+    """
+    Normalize a batch into a list of argument dicts. A batch is either a list of argument dicts or a dict of
+    equal-length column arrays keyed by argument name.
+    :param batch: List of argument dicts or dict of column arrays
+    :return: List of argument dicts, or None if the columns are not all the same length
+    """
+    if isinstance(batch, list):
+        return batch
+
+    lengths = set(len(column) for column in batch.values())
+    if len(lengths) > 1:
+        return None
+    length = lengths.pop() if lengths else 0
+    return [dict((name, column[i]) for name, column in batch.items()) for i in range(length)]
+
+
+def __call_function_batch(function_name, method, request, json_schema, build_args, check_arguments=None, vectorize=True):
+    """
+    Validate and evaluate every item of a batch request. Valid items are evaluated together in a single vectorized
+    call (or one call per item when the function does not broadcast), invalid items get their own error.
+    :param function_name: Name of the function used in log and error messages
+    :param method: Name of the financial function to call
+    :param request: Dict containing the batch request
+    :param json_schema: Schema each item of the batch is validated against
+    :param build_args: Function building the argument list from a single validated item
+    :param check_arguments: Optional function taking the function name and an item, returning an error message if
+    the item fails additional checks
+    :param vectorize: Whether the financial function broadcasts over array arguments
+    :return: Dict with a 'results' entry holding a 'result' or 'error' dict per item, in request order, or with
+    "encoding": "base64" the results encoded by __encode_results
+    """
+    validation_result = __validate_arguments(function_name, request, schemas.batch_schema)
+    if not validation_result.get('isValid'):
+        return {'error': validation_result.get('error')}
+
+    items = __batch_items(request['batch'])
+    if items is None:
+        return {'error': "batch columns must all be the same length"}
+
+    results = [None] * len(items)
+    valid_indices = []
+    valid_args = []
+    for index, item in enumerate(items):
+        validation_result = __validate_arguments(function_name, item, json_schema)
+        if not validation_result.get('isValid'):
+            results[index] = {'error': validation_result.get('error')}
+            continue
+        error = check_arguments(function_name, item) if check_arguments else None
+        if error:
+            results[index] = {'error': error}
+            continue
+        valid_indices.append(index)
+        valid_args.append(build_args(item))
+
+    if valid_args:
+        logger.info("Calling %s for a batch of %s items", method, len(valid_args))
+        function = __functions[method]
+        with metrics_helper.phase('ComputeTime'):
+            if vectorize:
+                values = function(*zip(*valid_args)).tolist()
+            else:
+                values = [function(*args) for args in valid_args]
+        for index, value in zip(valid_indices, values):
+            results[index] = {'result': value}
+
+    if request.get('encoding') == 'base64':
+        return __encode_results(function_name, results)
+    return {'results': results}
+
+
+# Largest number of cells a grid request may evaluate
+__max_grid_cells = 100000
+
+
+def __is_grid(request):
+    """
+    Whether the request is a grid request, i.e. carries a 'grid' of axes to evaluate the function over
+    :param request: Dict containing the request
+    :return: True if the request should be evaluated over the Cartesian product of its axes
+    """
+    return isinstance(request, dict) and 'grid' in request
+
+
+def __call_function_grid(function_name, method, request, json_schema, build_args):
+    """
+    Validate a grid request and evaluate the function over the Cartesian product of its axes in a single vectorized
+    call. The arguments outside 'grid' are shared by every cell. Each axis value is validated once, together with the
+    shared arguments, so validation grows with the length of the axes rather than with the number of cells.
+    :param function_name: Name of the function used in log and error messages
+    :param method: Name of the financial function to call
+    :param request: Dict with a 'grid' dict of axis name to list of values, an optional 'axes' list giving the order
+    of the dimensions (sorted axis names by default), and the shared arguments
+    :param json_schema: Schema a single set of arguments is validated against
+    :param build_args: Function building the argument list from a single validated set of arguments
+    :return: Dict with a 'result' entry holding the 'axes' names and the nested lists of 'values', one dimension per
+    axis in that order
+    """
+    validation_result = __validate_arguments(function_name, request, schemas.grid_schema)
+    if not validation_result.get('isValid'):
+        return {'error': validation_result.get('error')}
+
+    grid = request['grid']
+    axes = request.get('axes', sorted(grid))
+    if len(axes) != len(grid) or set(axes) != set(grid):
+        return {'error': "axes must name every axis of the grid once"}
+
+    cells = 1
+    for name in axes:
+        cells *= len(grid[name])
+    if cells > __max_grid_cells:
+        return {'error': "grid has {} cells, more than the maximum of {}".format(cells, __max_grid_cells)}
+
+    arguments = dict((name, value) for name, value in request.items() if name not in ('grid', 'axes'))
+    first_values = dict((name, grid[name][0]) for name in axes)
+    for name in axes:
+        for value in grid[name]:
+            item = dict(arguments, **first_values)
+            item[name] = value
+            validation_result = __validate_arguments(function_name, item, json_schema)
+            if not validation_result.get('isValid'):
+                return {'error': validation_result.get('error')}
+
+    import numpy
+    for dimension, name in enumerate(axes):
+        shape = [1] * len(axes)
+        shape[dimension] = len(grid[name])
+        arguments[name] = numpy.reshape(grid[name], shape)
+
+    logger.info("Calling %s over a grid of %s cells", method, cells)
+    with metrics_helper.phase('ComputeTime'):
+        values = __functions[method](*build_args(arguments))
+        values = numpy.broadcast_to(values, tuple(len(grid[name]) for name in axes)).tolist()
+    return {'result': {'axes': list(axes), 'values': values}}
+
+
+# Build the positional arguments of each financial function from a validated request
+
+def __fv_args(request):
+    return [request['rate'], request['nper'], request.get('pmt', 0), request.get('pv', 0), request.get('type', 0)]
+
+
+def __pv_args(request):
+    return [request['rate'], request['nper'], request.get('pmt', 0), request.get('fv', 0), request.get('type', 0)]
+
+
+def __npv_args(request):
+    return [request['rate'], __decode_values(request['values']), request.get('analytics', False)]
+
+
+def __pmt_args(request):
+    return [request['rate'], request['nper'], request['pv'], request.get('fv', 0), request.get('type', 0)]
+
+
+def __ppmt_args(request):
+    return [request['rate'], request['per'], request['nper'], request['pv'], request.get('fv', 0), request.get('type', 0)]
+
+
+def __irr_args(request):
+    return [__checked_array(request['values']), request.get('window')]
+
+
+def __mirr_args(request):
+    return [__checked_array(request['values']), request['finance_rate'], request['reinvest_rate']]
 
 
-def __call_numpy(method, args):
+def __nper_args(request):
+    return [request['rate'], request.get('pmt', 0), request['pv'], request.get('fv', 0), request.get('type', 0)]
+
+
+def __rate_args(request):
+    return [request['nper'], request.get('pmt', 0), request['pv'], request.get('fv', 0), request.get('type', 0), request.get('guess', 0.10)]
+
+
+# Small calculation run through each function by a warm-up request, including the array paths
+__warmup_calls = [
+    ('fv', [0.05, 10, -100, -100, 0]),
+    ('fv', [[0.05, 0], [10, 10], [-100, -100], [-100, 0], [0, 1]]),
+    ('pv', [0.05, 10, -100, 0, 0]),
+    ('npv', [0.1, [-100, 39, 59, 55, 20]]),
+    ('npv', [0.1, [-100, 39, 59, 55, 20], True]),
+    ('pmt', [0.05, 10, 1000, 0, 0]),
+    ('ppmt', [0.05, 1, 10, 1000, 0, 0]),
+    ('irr', [[-100, 39, 59, 55, 20], None]),
+    ('irr', [[-100, 39, 59, 55, 20, -100, 39], 5]),
+    ('mirr', [[-100, 39, 59, 55, 20], 0.12, 0.1]),
+    ('nper', [0.05, -100, 1000, 0, 0]),
+    ('rate', [10, -100, 1000, 0, 0, 0.1]),
+    ('rate', [[10, 10], [-100, -100], [1000, 1000], [0, 0], [0, 1], [0.1, 0.1]]),
+    ('amortization', [0.05, 10, 1000, 0, 0, 1, 10]),
+    ('npv_update', [None, [0.05, 0.1], None, [{'value': -100, 'period': 0}, {'value': 110, 'period': 1}],
+                    [{'value': 110, 'period': 1}]])
+]
+
+
+def __is_warmup(request):
+    """
+    Whether the request is a warm-up request, i.e. {"warmup": true}
+    :param request: Dict containing the request
+    :return: True if the request only asks to prime the container
+    """
+    return isinstance(request, dict) and request.get('warmup') is True
+
+
+def __warm_up():
+    """
+    Prime the container: import every dependency, compile every schema and run a small calculation through each
+    function, so that the next real request pays for none of it.
+    :return: Dict with a 'warmup' entry holding the time in milliseconds spent on each step
+    """
+    timings = {'functions': {}}
+    start = timer()
+
+    step_start = timer()
+    # imported for their side effect of loading the modules the functions import lazily
+    import numpy
+    import jsonschema
+    from scipy import optimize
+    timings['imports'] = (timer() - step_start) * 1000
+
+    step_start = timer()
+    validation_helper.compile_schemas([value for name, value in vars(schemas).items() if name.endswith('_schema')])
+    timings['schemas'] = (timer() - step_start) * 1000
+
+    for method, args in __warmup_calls:
+        step_start = timer()
+        __functions[method](*args)
+        timings['functions'][method] = timings['functions'].get(method, 0) + (timer() - step_start) * 1000
+
+    timings['total'] = (timer() - start) * 1000
+    logger.info("Warm-up done in %.1f ms", timings['total'])
+    return {'warmup': timings}
+
+
+def __amortization_args(request):
+    return [request['rate'], request['nper'], request['pv'], request.get('fv', 0), request.get('type', 0),
+            request.get('start_period', 1), request.get('end_period', request['nper'])]
+
+
+# Most periods of an amortization schedule returned at once, keeping responses well under Lambda's payload limit
+__max_amortization_periods = 10000
+
+
+def __check_periods(function_name, request):
     """
-    Call a NumPy method with a given set of arguments
-    :param method: NumPy method to call
-    :param args: Arguments for the provided NumPy method
-    :return: Result from NumPy
+    Check the periods of an amortization request are in range and not too many to return at once
+    :param function_name: Name of the function used in the error message
+    :param request: Dict containing a validated amortization request
+    :return: Error message if the check failed, None otherwise
     """
-    logger.info("Calling numpy.{} with args: {}".format(method, args))
-    return {'result': getattr(numpy, method)(*args)}
+    start_period = request.get('start_period', 1)
+    end_period = request.get('end_period', request['nper'])
+    if start_period > end_period or end_period > request['nper']:
+        return "{} requires start_period <= end_period <= nper".format(function_name)
+    if end_period - start_period + 1 > __max_amortization_periods:
+        return "{} returns at most {} periods, use start_period and end_period to fetch pages".format(
+            function_name, __max_amortization_periods)
+
+
+def __npv_update_args(request):
+    return [request.get('state'), request.get('rates'), request.get('start_date'), request.get('append', []),
+            request.get('remove', [])]
 
 
+def __check_npv_update(function_name, request):
+    """
+    Check the rates, state and flows of an NPV update request are consistent
+    :param function_name: Name of the function used in the error message
+    :param request: Dict containing a validated NPV update request
+    :return: Error message if the check failed, None otherwise
+    """
+    state = request.get('state')
+    rates = state['rates'] if state is not None else request['rates']
+    rates = rates if isinstance(rates, list) else [rates]
+    if any(rate <= -1 for rate in rates):
+        return "{} requires rates greater than -1".format(function_name)
+    if state is not None and len(state['sums']) != len(rates):
+        return "{} requires the state to hold one sum per rate".format(function_name)
+
+    flows = request.get('append', []) + request.get('remove', [])
+    periodic = set('period' in flow for flow in flows)
+    if state is not None and state.get('periodic') is not None:
+        periodic.add(state['periodic'])
+    if len(periodic) > 1:
+        return "{} requires flows all placed at a period or all at a date".format(function_name)
+
+    try:
+        state_date = state.get('start_date') if state is not None else None
+        for date in [request.get('start_date'), state_date] + [flow.get('date') for flow in flows]:
+            if date is not None:
+                npv_accumulator.parse_date(date)
+    except ValueError:
+        return "{} requires valid dates".format(function_name)
+
+    count = state['count'] if state is not None else 0
+    if len(request.get('remove', [])) > count + len(request.get('append', [])):
+        return "{} cannot remove more flows than were appended".format(function_name)
+
+
+def __check_values(function_name, request):
+    """
+    Check the values of a request sent as base64 encode a whole number of float64, without decoding them
+    :param function_name: Name of the function used in the error message
+    :param request: Dict containing a validated 'values' list or base64 string
+    :return: Error message if the check failed, None otherwise
+    """
+    values = request['values']
+    if not isinstance(values, __string_types):
+        return None
+    # the schema's pattern lets a trailing newline through, as $ matches before it, which b64decode rejects
+    if not values or '\n' in values or len(values) % 4 or __values_count(values) % 1:
+        return "{} requires base64 values encoding a whole number of float64".format(function_name)
+
+
+def __values_count(values):
+    """
+    Number of values in a list, or in a validated base64 string (a fraction if it does not hold whole float64)
+    """
+    if not isinstance(values, __string_types):
+        return len(values)
+    return (len(values) * 3 // 4 - (len(values) - len(values.rstrip('=')))) / 8.0
+
+
+def __check_irr(function_name, request):
+    """
+    Check the values of an IRR request can have a rate of return: the window fits in the values when there is one,
+    otherwise the values change sign
+    :param function_name: Name of the function used in the error message
+    :param request: Dict containing a validated IRR request
+    :return: Error message if the check failed, None otherwise
+    """
+    window = request.get('window')
+    if window is None:
+        return __check_sign_change(function_name, request)
+    error = __check_values(function_name, request)
+    if error:
+        return error
+    if window > __values_count(request['values']):
+        return "{} requires window <= the number of values".format(function_name)
+
+
+# Values last sent and the float array __check_sign_change converted them to, so that the arguments of the item it
+# checked are built without decoding or converting them again
+__checked_values = [None, None]
+
+
+def __checked_array(values):
+    """
+    Cash flow values as converted by the last __check_sign_change if it checked these very values, else decoded
+    :param values: List of numbers or base64 string
+    :return: Float NumPy array, list of numbers or decoded NumPy array
+    """
+    if __checked_values[0] is values:
+        array = __checked_values[1]
+        __checked_values[:] = [None, None]
+        return array
+    return __decode_values(values)
+
+
+def __check_sign_change(function_name, request):
+    """
+    Check the values of an IRR or MIRR request are finite and contain at least one positive and one negative value,
+    in a single pass over a NumPy array rather than sorting them
+    :param function_name: Name of the function used in the error message
+    :param request: Dict containing a validated 'values' list or base64 string
+    :return: Error message if the check failed, None otherwise
+    """
+    error = __check_values(function_name, request)
+    if error:
+        return error
+
+    import numpy
+    values = numpy.asarray(__decode_values(request['values']), dtype=float)
+    __checked_values[:] = [request['values'], values]
+    finite = numpy.isfinite(values)
+    if not finite.all():
+        index = int(numpy.argmin(finite))
+        return "{} requires finite values, values[{}] is {!r}".format(function_name, index, float(values[index]))
+    if values.min() > 0 or values.max() <= 0:
+        return "{} requires at least one positive and one negative value".format(function_name)
+
+
+@metrics_helper.timed('FV')
 def fv_handler(request, context):
     """
     Future Value calculation
-    :param request: Dict containing the parameters to pass to the formula.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a 'grid' of axes
+    to evaluate the formula over, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation (the 'axes' and nested 'values' for
+    a grid), or a 'results' list for a batch
     """
-    logger.info("FV request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("FV request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('FV', 'fv', request, schemas.fv_schema, __fv_args)
+
+    if __is_grid(request):
+        return __call_function_grid('FV', 'fv', request, schemas.fv_schema, __fv_args)
 
     validation_result = __validate_arguments('FV', request, schemas.fv_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['rate'], request['nper'], request.get('pmt', 0), request.get('pv', 0), request.get('type', 0)]
-    return __call_numpy('fv', args)
+    args = __fv_args(request)
+    return __call_function('fv', args)
 
 
+@metrics_helper.timed('PV')
 def pv_handler(request, context):
     """
     Present Value calculation
-    :param request: Dict containing the parameters to pass to the formula.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a 'grid' of axes
+    to evaluate the formula over, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation (the 'axes' and nested 'values' for
+    a grid), or a 'results' list for a batch
     """
-    logger.info("PV request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("PV request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('PV', 'pv', request, schemas.pv_schema, __pv_args)
+
+    if __is_grid(request):
+        return __call_function_grid('PV', 'pv', request, schemas.pv_schema, __pv_args)
 
     validation_result = __validate_arguments('PV', request, schemas.pv_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['rate'], request['nper'], request.get('pmt', 0), request.get('fv', 0), request.get('type', 0)]
-    return __call_numpy('pv', args)
+    args = __pv_args(request)
+    return __call_function('pv', args)
 
 
+@metrics_helper.timed('NPV')
 def npv_handler(request, context):
     """
-    Net Present Value of a cash flow series
-    :param request: Dict containing the parameters to pass to the formula.
+    Net Present Value of a cash flow series. With "analytics": true, the result also holds the Macaulay and modified
+    durations, convexity and DV01, computed in the same pass. The values may be sent as a base64 string of
+    little-endian float64.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation (a dict of npv, macaulay_duration,
+    modified_duration, convexity and dv01 for analytics), or a 'results' list for a batch
     """
-    logger.info("NPV request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("NPV request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('NPV', 'npv', request, schemas.npv_schema, __npv_args, __check_values,
+                                     vectorize=False)
 
     validation_result = __validate_arguments('NPV', request, schemas.npv_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['rate'], request['values']]
-    return __call_numpy('npv', args)
+    error = __check_values('NPV', request)
+    if error:
+        return {'error': error}
+
+    args = __npv_args(request)
+    return __call_function('npv', args)
 
 
+@metrics_helper.timed('PMT')
 def pmt_handler(request, context):
     """
     Compute the payment against loan principal plus interest
-    :param request: Dict containing the parameters to pass to the formula.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a 'grid' of axes
+    to evaluate the formula over, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation (the 'axes' and nested 'values' for
+    a grid), or a 'results' list for a batch
     """
-    logger.info("PMT request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("PMT request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('PMT', 'pmt', request, schemas.pmt_schema, __pmt_args)
+
+    if __is_grid(request):
+        return __call_function_grid('PMT', 'pmt', request, schemas.pmt_schema, __pmt_args)
 
     validation_result = __validate_arguments('PMT', request, schemas.pmt_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['rate'], request['nper'], request['pv'], request.get('fv', 0), request.get('type', 0)]
-    return __call_numpy('pmt', args)
+    args = __pmt_args(request)
+    return __call_function('pmt', args)
 
 
+@metrics_helper.timed('PPMT')
 def ppmt_handler(request, context):
     """
     Compute the payment against loan principal
-    :param request: Dict containing the parameters to pass to the formula.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation, or a 'results' list for a batch
     """
-    logger.info("PPMT request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("PPMT request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('PPMT', 'ppmt', request, schemas.ppmt_schema, __ppmt_args)
 
     validation_result = __validate_arguments('PPMT', request, schemas.ppmt_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['rate'], request['per'], request['nper'], request['pv'], request.get('fv', 0), request.get('type', 0)]
-    return __call_numpy('ppmt', args)
+    args = __ppmt_args(request)
+    return __call_function('ppmt', args)
 
 
+@metrics_helper.timed('IRR')
 def irr_handler(request, context):
     """
-    Internal Rate of Return calculation.
-    :param request: Dict containing the parameters to pass to the formula.
+    Internal Rate of Return calculation. With a 'window', the IRR of every window of that many consecutive values.
+    The values may be sent as a base64 string of little-endian float64.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation (a list with None for the windows
+    without a rate of return when windowed), or a 'results' list for a batch
     """
-    logger.info("IRR request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("IRR request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('IRR', 'irr', request, schemas.irr_schema, __irr_args, __check_irr, vectorize=False)
 
     validation_result = __validate_arguments('IRR', request, schemas.irr_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
-    else:
-        # IRR requires at least one positive and one negative value
-        sorted_values = sorted(request.get('values'))
-        values_length = len(request.get('values'))
-        if sorted_values[0] > 0 or sorted_values[values_length - 1] <= 0:
-            return {'error': "IRR requires at least one positive and one negative value"}
 
-    args = [request['values']]
-    return __call_numpy('irr', args)
+    error = __check_irr('IRR', request)
+    if error:
+        return {'error': error}
 
+    args = __irr_args(request)
+    return __call_function('irr', args)
 
 
+@metrics_helper.timed('MIRR')
 def mirr_handler(request, context):
     """
-    Modified Internal Rate of Return calculation.
-    :param request: Dict containing the parameters to pass to the formula.
+    Modified Internal Rate of Return calculation. The values may be sent as a base64 string of little-endian float64.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation, or a 'results' list for a batch
     """
-    logger.info("MIRR request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("MIRR request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('MIRR', 'mirr', request, schemas.mirr_schema, __mirr_args, __check_sign_change, vectorize=False)
 
     validation_result = __validate_arguments('MIRR', request, schemas.mirr_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
-    else:
-        # MIRR requires at least one positive and one negative value
-        sorted_values = sorted(request.get('values'))
-        values_length = len(request.get('values'))
-        if sorted_values[0] > 0 or sorted_values[values_length - 1] <= 0:
-            return {'error': "MIRR requires at least one positive and one negative value"}
 
-    args = [request['values'], request['finance_rate'], request['reinvest_rate']]
-    return __call_numpy('mirr', args)
+    error = __check_sign_change('MIRR', request)
+    if error:
+        return {'error': error}
+
+    args = __mirr_args(request)
+    return __call_function('mirr', args)
 
 
+@metrics_helper.timed('NPER')
 def nper_handler(request, context):
     """
     Number of periodic payments required to pay off a loan.
-    :param request: Dict containing the parameters to pass to the formula.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a 'grid' of axes
+    to evaluate the formula over, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation (the 'axes' and nested 'values' for
+    a grid), or a 'results' list for a batch
     """
-    logger.info("NPER request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("NPER request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('NPER', 'nper', request, schemas.nper_schema, __nper_args)
+
+    if __is_grid(request):
+        return __call_function_grid('NPER', 'nper', request, schemas.nper_schema, __nper_args)
 
     validation_result = __validate_arguments('NPER', request, schemas.nper_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['rate'], request.get('pmt', 0), request['pv'], request.get('fv', 0), request.get('type', 0)]
-    return __call_numpy('nper', args)
+    args = __nper_args(request)
+    return __call_function('nper', args)
 
 
+@metrics_helper.timed('Rate')
 def rate_handler(request, context):
     """
     Rate of interest period.
-    :param request: Dict containing the parameters to pass to the formula.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a warm-up request.
     :param context: Lambda execution context
-    :return: Dict with a 'result' entry containing the result of the calculation
+    :return: Dict with a 'result' entry containing the result of the calculation, or a 'results' list for a batch
     """
-    logger.info("Rate request: {}".format(request))
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("Rate request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('Rate', 'rate', request, schemas.rate_schema, __rate_args)
 
     validation_result = __validate_arguments('Rate', request, schemas.rate_schema)
     if not validation_result.get('isValid'):
         return {'error': validation_result.get('error')}
 
-    args = [request['nper'], request.get('pmt', 0), request['pv'], request.get('fv', 0), request.get('type', 0), request.get('guess', 0.10)]
-    return __call_numpy('rate', args)
+    args = __rate_args(request)
+    return __call_function('rate', args)
+
+
+
+@metrics_helper.timed('Amortization')
+def amortization_handler(request, context):
+    """
+    Amortization schedule of a loan. Long schedules can be fetched in pages through start_period and end_period.
+    :param request: Dict containing the parameters to pass to the formula, or a 'batch' of them, or a warm-up request.
+    :param context: Lambda execution context
+    :return: Dict with a 'result' entry containing the schedule as lists of period, payment, interest, principal and
+    balance, or a 'results' list for a batch
+    """
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("Amortization request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('Amortization', 'amortization', request, schemas.amortization_schema,
+                                     __amortization_args, __check_periods, vectorize=False)
+
+    validation_result = __validate_arguments('Amortization', request, schemas.amortization_schema)
+    if not validation_result.get('isValid'):
+        return {'error': validation_result.get('error')}
+
+    error = __check_periods('Amortization', request)
+    if error:
+        return {'error': error}
+
+    args = __amortization_args(request)
+    return __call_function('amortization', args)
+
+
+@metrics_helper.timed('NPVUpdate')
+def npv_update_handler(request, context):
+    """
+    Running Net Present Value of a stream of cash flows. Each call appends (or removes) flows to the state returned by
+    the previous call, so its cost depends only on the flows it carries, never on the history of the stream.
+    :param request: Dict with either the 'rates' (and optional 'start_date') of a new stream or the 'state' of an
+    existing one, and the 'append' and 'remove' lists of flows, each with a 'value' and a 'period' or a 'date'.
+    Or a 'batch' of them, or a warm-up request.
+    :param context: Lambda execution context
+    :return: Dict with a 'result' entry containing the 'npv' and the 'state' to send with the next update, or a
+    'results' list for a batch
+    """
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("NPV update request: %s", log_helper.summarize(request))
+
+    if __is_batch(request):
+        return __call_function_batch('NPV update', 'npv_update', request, schemas.npv_update_schema,
+                                     __npv_update_args, __check_npv_update, vectorize=False)
+
+    validation_result = __validate_arguments('NPV update', request, schemas.npv_update_schema)
+    if not validation_result.get('isValid'):
+        return {'error': validation_result.get('error')}
+
+    error = __check_npv_update('NPV update', request)
+    if error:
+        return {'error': error}
+
+    args = __npv_update_args(request)
+    return __call_function('npv_update', args)
+
+
+# Handlers the router dispatches to, by function name
+__handlers = {
+    'fv': fv_handler,
+    'pv': pv_handler,
+    'npv': npv_handler,
+    'pmt': pmt_handler,
+    'ppmt': ppmt_handler,
+    'irr': irr_handler,
+    'mirr': mirr_handler,
+    'nper': nper_handler,
+    'rate': rate_handler,
+    'amortization': amortization_handler,
+    'npv_update': npv_update_handler
+}
+
+
+def __unknown_function_error(function):
+    return "'{}' is not one of {}".format(function, sorted(__handlers))
+
+
+def __route_calls(calls, context):
+    """
+    Evaluate a list of calls to any of the functions. Calls to the same function are grouped into a single batch
+    request to its handler, so they are still validated and evaluated together.
+    :param calls: List of dicts, each with a 'function' entry and the arguments of that function
+    :param context: Lambda execution context
+    :return: Dict with a 'results' entry holding the 'result' or 'error' dict of each call, in request order
+    """
+    results = [None] * len(calls)
+    groups = {}
+    for index, call in enumerate(calls):
+        function = call.get('function')
+        if function is None:
+            results[index] = {'error': "'function' is a required property"}
+            continue
+        if not isinstance(function, __string_types):
+            results[index] = {'error': "{!r} is not of type 'string'".format(function)}
+            continue
+        if function not in __handlers:
+            results[index] = {'error': __unknown_function_error(function)}
+            continue
+        indices, batch = groups.setdefault(function, ([], []))
+        indices.append(index)
+        batch.append(dict((name, value) for name, value in call.items() if name != 'function'))
+
+    for function, (indices, batch) in groups.items():
+        response = __handlers[function]({'batch': batch}, context)
+        function_results = response.get('results') or [{'error': response.get('error')}] * len(indices)
+        for index, result in zip(indices, function_results):
+            results[index] = result
+
+    return {'results': results}
+
+
+@metrics_helper.timed('Router')
+def router_handler(request, context):
+    """
+    Single entry point for all the functions, so that they share one pool of warm containers.
+    :param request: Dict with a 'function' entry naming the function and its arguments (or a 'batch' of them), or a
+    'calls' list of such dicts possibly naming different functions, or a warm-up request.
+    :param context: Lambda execution context
+    :return: The response of the function's handler, or a 'results' list with one entry per call
+    """
+    if __is_warmup(request):
+        return __warm_up()
+
+    logger.info("Router request: %s", log_helper.summarize(request))
+
+    validation_result = __validate_arguments('Router', request, schemas.router_schema)
+    if not validation_result.get('isValid'):
+        return {'error': validation_result.get('error')}
+
+    if 'calls' in request:
+        return __route_calls(request['calls'], context)
 
+    function = request['function']
+    if function not in __handlers:
+        return {'error': __unknown_function_error(function)}
+    arguments = dict((name, value) for name, value in request.items() if name != 'function')
+    return __handlers[function](arguments, context)
@@ -0,0 +1,262 @@
+# Local HTTP gateway exposing the handlers, for running the functions outside of Lambda. Requires Python 3.
+#
+# POST /<function> with the JSON request of that function's handler (e.g. POST /pmt), or POST / for the router.
+# GET /health answers without touching the handlers. Connections are kept alive and may pipeline requests, whose
+# responses are sent back in request order. CPU-bound requests run in a pool of worker processes, everything else
+# inline on the event loop. Reading stops while too many requests are in flight, pushing back on clients through TCP.
+#
+# Usage: python local_gateway.py [--host HOST] [--port PORT] [--workers N] [--max-in-flight N] [--max-pipeline N]
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import lambda_handlers
+
+# Functions whose requests always go to the worker processes; batches and mixed calls of any function do too
+PROCESS_POOL_FUNCTIONS = frozenset(['irr', 'mirr', 'rate'])
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_LINE_BYTES = 64 * 1024
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error'
+}
+
+
+def handler_for(function):
+    """
+    Returns the handler serving /<function>, the router for /, or None if there is none.
+    """
+    if function == '':
+        return lambda_handlers.router_handler
+    return getattr(lambda_handlers, function + '_handler', None)
+
+
+def invoke_handler(function, request):
+    """
+    Calls the handler of a function. Runs in the worker processes, hence the function name rather than the handler.
+    """
+    return handler_for(function)(request, None)
+
+
+class HttpError(Exception):
+    """
+    Malformed or unsupported HTTP request, answered with the given status before closing the connection.
+    """
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+
+class Gateway(object):
+    """
+    Serves the handlers over HTTP/1.1 on an asyncio event loop.
+    """
+    def __init__(self, workers=None, max_in_flight=256, max_pipeline=32):
+        """
+        :param workers: Number of worker processes for CPU-bound requests (default one per CPU), 0 to run inline
+        :param max_in_flight: Requests processed at once across all connections before reading stops
+        :param max_pipeline: Requests read ahead on a single connection before reading stops
+        """
+        self.executor = ProcessPoolExecutor(workers) if workers != 0 else None
+        self.max_in_flight = max_in_flight
+        self.max_pipeline = max_pipeline
+        self.in_flight = None
+
+    async def start(self, host, port):
+        """
+        Starts listening and returns the asyncio server.
+        """
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        return await asyncio.start_server(self.serve_connection, host, port, limit=MAX_LINE_BYTES)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def serve_connection(self, reader, writer):
+        """
+        Reads the requests of a connection and queues their responses, which a second task writes back in order.
+        """
+        responses = asyncio.Queue(self.max_pipeline)
+        sender = asyncio.ensure_future(self.send_responses(responses, writer))
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HttpError as err:
+                    await responses.put((self.completed(err.status, {'error': err.message}), False))
+                    break
+                if request is None:
+                    break
+
+                method, path, body, keep_alive = request
+                await self.in_flight.acquire()
+                task = asyncio.ensure_future(self.respond(method, path, body))
+                task.add_done_callback(lambda _: self.in_flight.release())
+                await responses.put((task, keep_alive))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+
+    async def send_responses(self, responses, writer):
+        """
+        Writes the responses of a connection in request order until the end of the queue or a closing response.
+        """
+        writing = True
+        while True:
+            item = await responses.get()
+            if item is None:
+                return
+            task, keep_alive = item
+            status, payload = await task
+            if not writing:
+                continue
+            try:
+                writer.write(self.encode_response(status, payload, keep_alive))
+                await writer.drain()
+            except ConnectionError:
+                writing = False
+            writing = writing and keep_alive
+
+    @staticmethod
+    async def read_line(reader):
+        """
+        Reads the request line or a header line, which may not be longer than MAX_LINE_BYTES.
+        """
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise HttpError(431, 'Request line or header longer than {} bytes'.format(MAX_LINE_BYTES))
+
+    @staticmethod
+    async def read_request(reader):
+        """
+        Reads one HTTP request. Returns (method, path, body, keep_alive), or None once the client is done.
+        """
+        line = await Gateway.read_line(reader)
+        if not line.strip():
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise HttpError(400, 'Malformed request line')
+        method, target, version = parts
+
+        headers = {}
+        while True:
+            line = await Gateway.read_line(reader)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HttpError(411, 'Chunked requests are not supported, send a Content-Length')
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HttpError(400, 'Invalid Content-Length')
+        if length < 0:
+            raise HttpError(400, 'Invalid Content-Length')
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, 'Request body larger than {} bytes'.format(MAX_BODY_BYTES))
+        body = await reader.readexactly(length) if length else b''
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, target.split('?')[0], body, keep_alive
+
+    async def respond(self, method, path, body):
+        """
+        Computes the status and JSON payload answering a request.
+        """
+        function = path.strip('/')
+        if function == 'health':
+            return 200, {'status': 'ok'}
+        handler = handler_for(function)
+        if handler is None:
+            return 404, {'error': "No function at {}".format(path)}
+        if method != 'POST':
+            return 405, {'error': 'Functions are called with POST'}
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return 400, {'error': 'Request body is not valid JSON'}
+
+        try:
+            if self.executor is not None and self.is_cpu_bound(function, request):
+                loop = asyncio.get_event_loop()
+                return 200, await loop.run_in_executor(self.executor, invoke_handler, function, request)
+            return 200, handler(request, None)
+        except Exception as err:
+            return 500, {'error': 'Internal error: {}'.format(err)}
+
+    @staticmethod
+    def is_cpu_bound(function, request):
+        """
+        Whether a request should run in the worker processes rather than block the event loop.
+        """
+        if not isinstance(request, dict):
+            return False
+        if 'batch' in request or 'calls' in request:
+            return True
+        if function == '':
+            function = request.get('function')
+        return isinstance(function, str) and function in PROCESS_POOL_FUNCTIONS
+
+    @staticmethod
+    def completed(status, payload):
+        future = asyncio.get_event_loop().create_future()
+        future.set_result((status, payload))
+        return future
+
+    @staticmethod
+    def encode_response(status, payload, keep_alive):
+        body = json.dumps(payload, default=float).encode('utf-8')
+        head = 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+            status, REASONS[status], len(body), 'keep-alive' if keep_alive else 'close')
+        return head.encode('latin-1') + body
+
+
+async def serve(host, port, workers, max_in_flight, max_pipeline):
+    gateway = Gateway(workers, max_in_flight, max_pipeline)
+    server = await gateway.start(host, port)
+    print('Serving the financial functions on http://{}:{}/'.format(host, port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        gateway.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP gateway for the financial function handlers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes for CPU-bound requests, 0 to run them inline')
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    parser.add_argument('--max-pipeline', type=int, default=32)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_in_flight, args.max_pipeline))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,68 @@
 import os
 import sys
+import random
 import logging
 
+# Payload summaries show at most this many items of each list and characters of each string
+MAX_ITEMS = int(os.getenv('LOG_MAX_ITEMS', '10'))
+MAX_STRING_LENGTH = int(os.getenv('LOG_MAX_STRING_LENGTH', '200'))
+
+# Strings decoded from JSON are unicode on Python 2; a double underscore name would be mangled in PayloadSummary
+try:
+    _string_types = (basestring,)
+except NameError:
+    _string_types = (str,)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through every record at WARNING or above and the given fraction of the records below.
+    """
+    def __init__(self, sample_rate):
+        logging.Filter.__init__(self)
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.sample_rate
+
+
+class PayloadSummary(object):
+    """
+    Size-capped rendering of a request payload or argument list for log messages. Nothing is rendered until a log
+    record using it is actually emitted, so payloads logged below the log level cost nothing.
+    """
+    def __init__(self, payload, max_items=MAX_ITEMS, max_string_length=MAX_STRING_LENGTH):
+        self.payload = payload
+        self.max_items = max_items
+        self.max_string_length = max_string_length
+
+    def _truncate(self, value):
+        if isinstance(value, dict):
+            return dict((key, self._truncate(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            truncated = [self._truncate(item) for item in value[:self.max_items]]
+            if len(value) > self.max_items:
+                truncated.append('... {} more'.format(len(value) - self.max_items))
+            return truncated
+        if isinstance(value, _string_types) and len(value) > self.max_string_length:
+            return value[:self.max_string_length] + '...'
+        return value
+
+    def __str__(self):
+        return str(self._truncate(self.payload))
+
+
+def summarize(payload):
+    """
+    Wraps a payload for lazy, size-capped logging, e.g. logger.info("Request: %s", summarize(request)).
+    """
+    return PayloadSummary(payload)
+
+
 def getLogger(name):
     """
-    Initializes logger with given name. Sets log level based on lambda environment variable value.
+    Initializes logger with given name. Sets log level based on lambda environment variable value, and samples the
+    records below WARNING based on the LOG_SAMPLE_RATE environment variable (a fraction between 0 and 1, default 1).
     """
     # get logger level from function env var and create logger
     log_level = os.getenv('LOG_LEVEL', 'INFO')
@@ -12,6 +70,14 @@ def getLogger(name):
     if not isinstance(numeric_level, int):
         raise ValueError('Invalid log level: %s' % log_level)
 
+    sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '1'))
+    if not 0 <= sample_rate <= 1:
+        raise ValueError('Invalid log sample rate: %s' % sample_rate)
+
     logger = logging.getLogger(name)
     logger.setLevel(numeric_level)
+    for existing_filter in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+        logger.removeFilter(existing_filter)
+    if sample_rate < 1:
+        logger.addFilter(SamplingFilter(sample_rate))
     return logger
@@ -0,0 +1,179 @@
+# Per-invocation latency metrics of the handlers, emitted as CloudWatch embedded metric format (EMF) log lines.
+# Disabled unless the METRICS_ENABLED environment variable is 'true' or a sink is set with set_sink.
+
+from __future__ import print_function
+import functools
+import json
+import os
+import threading
+import time
+from timeit import default_timer as timer
+
+NAMESPACE = os.getenv('METRICS_NAMESPACE', 'FinancialFunctions')
+TIME_METRICS = ['ValidationTime', 'ComputeTime', 'SerializationTime', 'OtherTime', 'TotalTime']
+
+__string_types = (str, type(u''))
+
+# Timings of the invocation in progress on this thread, by phase name
+__state = threading.local()
+
+
+def stdout_sink(record):
+    """
+    Prints the record as a single JSON line, which CloudWatch Logs turns into metrics.
+    """
+    print(json.dumps(record))
+
+
+class MemorySink(object):
+    """
+    Keeps emitted records in memory, for tests.
+    """
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+
+__sink = stdout_sink if os.getenv('METRICS_ENABLED', 'false').lower() == 'true' else None
+
+
+def set_sink(sink):
+    """
+    Sets the function receiving metric records, or disables metrics when None. Returns the previous sink.
+    """
+    global __sink
+    previous, __sink = __sink, sink
+    return previous
+
+
+class PhaseTimer(object):
+    """
+    Context manager adding the time spent in its block to the timings of a phase.
+    """
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings[self.name] = self.timings.get(self.name, 0) + (timer() - self.start) * 1000
+
+
+class NullTimer(object):
+    """
+    Context manager doing nothing, used when no invocation is being timed.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+__null_timer = NullTimer()
+
+
+def count(name, value=1):
+    """
+    Adds value to the named count metric of the invocation in progress, if any.
+    """
+    counts = getattr(__state, 'counts', None)
+    if counts is not None:
+        counts[name] = counts.get(name, 0) + value
+
+
+def phase(name):
+    """
+    Times a block as part of the given phase of the invocation in progress, e.g. with phase('ComputeTime'): ...
+    """
+    timings = getattr(__state, 'timings', None)
+    return __null_timer if timings is None else PhaseTimer(timings, name)
+
+
+def __count_items(payload):
+    """
+    Number of values in a request: lists of numbers count their length without visiting each element, and base64
+    'values' strings count the float64 values they encode.
+    """
+    if isinstance(payload, dict):
+        return sum(__count_base64(value) if key == 'values' and isinstance(value, __string_types)
+                   else __count_items(value) for key, value in payload.items())
+    if isinstance(payload, (list, tuple)):
+        if payload and isinstance(payload[0], (dict, list, tuple)):
+            return sum(__count_items(value) for value in payload)
+        return len(payload)
+    return 1
+
+
+def __count_base64(values):
+    """
+    Number of float64 values a base64 string encodes, from its length and padding.
+    """
+    return (len(values) * 3 // 4 - len(values) + len(values.rstrip('='))) // 8
+
+
+def __record(function_name, timings, counts, input_items, response_bytes):
+    """
+    Builds the EMF record of an invocation.
+    """
+    timings['OtherTime'] = timings['TotalTime'] - sum(timings.get(name, 0) for name in TIME_METRICS[:-2])
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [['Function']],
+                'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in TIME_METRICS] + [
+                    {'Name': 'InputItems', 'Unit': 'Count'},
+                    {'Name': 'ResponseBytes', 'Unit': 'Bytes'}
+                ] + [{'Name': name, 'Unit': 'Count'} for name in sorted(counts)]
+            }]
+        },
+        'Function': function_name,
+        'InputItems': input_items,
+        'ResponseBytes': response_bytes
+    }
+    for name in TIME_METRICS:
+        record[name] = timings.get(name, 0)
+    record.update(counts)
+    return record
+
+
+def timed(function_name):
+    """
+    Decorator for a handler emitting the time spent in each phase, the input size and the response size of every
+    invocation to the sink. A handler called by another timed handler, as the router calls the function handlers,
+    emits no record of its own: its phases are added to the invocation that called it, and only that invocation's
+    response is serialized to measure its size.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(request, context):
+            sink = __sink
+            if sink is None or getattr(__state, 'timings', None) is not None:
+                return handler(request, context)
+
+            timings = {}
+            counts = {}
+            __state.timings = timings
+            __state.counts = counts
+            start = timer()
+            try:
+                response = handler(request, context)
+                with PhaseTimer(timings, 'SerializationTime'):
+                    response_bytes = len(json.dumps(response, default=str))
+            finally:
+                __state.timings = None
+                __state.counts = None
+            timings['TotalTime'] = (timer() - start) * 1000
+
+            sink(__record(function_name, timings, counts, __count_items(request), response_bytes))
+            return response
+        return wrapper
+    return decorator
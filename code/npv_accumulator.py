@@ -0,0 +1,120 @@
+# Running NPV of an append-only stream of cash flows, updated in O(1) per flow and serializable between invocations
+
+import datetime
+import numbers
+
+# Beyond a handful of rates, recomputing from the flows is cheaper than carrying a sum per rate
+MAX_RATES = 16
+
+
+def parse_date(value):
+    """
+    Converts an ISO date string (YYYY-MM-DD) to a date. Dates are returned unchanged.
+    """
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def discount_factor(rate, time):
+    """
+    Returns (1 + rate) ** -time, or inf where it is too large for a float.
+    """
+    try:
+        return (1 + rate) ** -time
+    except OverflowError:
+        return float('inf')
+
+
+class NpvAccumulator(object):
+    """
+    Discounted sums of a stream of cash flows at one or a few fixed rates. Flows are appended (or removed) one at a
+    time, each updating every sum once, so re-pricing after a new flow never revisits the old ones.
+
+    Flows are either periodic, placed at a period number and discounted like npv (period 0 is not discounted), or
+    dated, discounted like xnpv to start_date over years of 365 days. Without a start_date, the date of the first
+    dated flow becomes the start date.
+    """
+    def __init__(self, rates, start_date=None):
+        """
+        :param rates: Rate, or list of at most MAX_RATES rates, to discount at
+        :param start_date: Date (or ISO date string) dated flows are discounted to
+        """
+        self.single_rate = isinstance(rates, numbers.Real)
+        self.rates = [float(rates)] if self.single_rate else [float(rate) for rate in rates]
+        if not self.rates or len(self.rates) > MAX_RATES:
+            raise ValueError('between 1 and {} rates are required'.format(MAX_RATES))
+        if any(rate <= -1 for rate in self.rates):
+            raise ValueError('rates must be greater than -1')
+        self.start_date = parse_date(start_date) if start_date is not None else None
+        self.periodic = None
+        self.sums = [0.0] * len(self.rates)
+        self.count = 0
+
+    def time_of(self, when):
+        """
+        Number of periods, or of years since the start date, at which a flow paid at when is discounted.
+        """
+        periodic = isinstance(when, numbers.Real)
+        if self.periodic is None:
+            self.periodic = periodic
+        elif periodic != self.periodic:
+            raise ValueError('flows must all be placed at a period or all at a date')
+        if periodic:
+            return when
+
+        date = parse_date(when)
+        if self.start_date is None:
+            self.start_date = date
+        return (date - self.start_date).days / 365.0
+
+    def add(self, value, when, sign):
+        time = self.time_of(when)
+        for index, rate in enumerate(self.rates):
+            self.sums[index] += sign * value * discount_factor(rate, time)
+        self.count += sign
+
+    def append(self, value, when):
+        """
+        Adds a flow of value paid at when, a period number or a date.
+        """
+        self.add(value, when, 1)
+
+    def remove(self, value, when):
+        """
+        Takes out a flow previously appended with the same value and when.
+        """
+        if self.count == 0:
+            raise ValueError('no flow to remove')
+        self.add(value, when, -1)
+
+    def npv(self):
+        """
+        Returns the NPV of the flows, or the list of NPVs at each rate if the accumulator was given a list of rates.
+        """
+        return self.sums[0] if self.single_rate else list(self.sums)
+
+    def to_dict(self):
+        """
+        Returns the state of the accumulator as a JSON serializable dict.
+        """
+        return {
+            'rates': self.rates[0] if self.single_rate else list(self.rates),
+            'start_date': self.start_date.isoformat() if self.start_date is not None else None,
+            'periodic': self.periodic,
+            'sums': list(self.sums),
+            'count': self.count
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restores an accumulator from the dict returned by to_dict.
+        """
+        accumulator = cls(state['rates'], state.get('start_date'))
+        if len(state['sums']) != len(accumulator.rates):
+            raise ValueError('state must hold one sum per rate')
+        accumulator.periodic = state.get('periodic')
+        accumulator.sums = [float(value) for value in state['sums']]
+        accumulator.count = state['count']
+        return accumulator
@@ -0,0 +1,233 @@
+# Compiled JSON schema validators, memoized per container, with a fast path for flat schemas of scalar arguments
+# and arrays of numbers. jsonschema is only imported once a request has to go through a full validator.
+
+import math
+import numbers
+import re
+
+try:
+    __integer_types = (int, long)
+    __string_types = (basestring,)
+except NameError:
+    __integer_types = (int,)
+    __string_types = (str,)
+__number_types = frozenset(__integer_types + (float,))
+
+# Keywords a schema may use and still be checked by the fast path
+__flat_schema_keywords = frozenset(['type', 'properties', 'required', 'anyOf', 'additionalProperties'])
+__flat_property_keywords = frozenset(['type', 'enum', 'minimum'])
+__array_property_keywords = frozenset(['type', 'items', 'minItems', 'pattern'])
+__array_item_keywords = frozenset(['type', 'minItems'])
+
+# id of schema -> (schema, compiled validator or fast check). Holding the schema keeps its id from being reused.
+__validators = {}
+__fast_checks = {}
+
+
+def __is_number_array(property_schema):
+    """
+    Whether a property schema describes an array of numbers, possibly also accepting a string.
+    """
+    types = property_schema.get('type')
+    types = types if isinstance(types, list) else [types]
+    items = property_schema.get('items', {})
+    return ('array' in types and not set(types) - set(['array', 'string']) and items.get('type') == 'number'
+            and not set(items) - __array_item_keywords)
+
+
+def __first_invalid_number(values):
+    """
+    Index of the first value of a list that is not a finite number, or None if they all are. The element types are
+    collected and the finiteness checked by NumPy in C loops rather than element by element in Python.
+    """
+    if not values:
+        return None
+    types = list(map(type, values))
+    if not set(types) <= __number_types:
+        return next(index for index, value_type in enumerate(types) if value_type not in __number_types)
+
+    import numpy
+    try:
+        with numpy.errstate(over='ignore'):
+            finite = numpy.isfinite(numpy.asarray(values, dtype=float))
+    except (OverflowError, TypeError):
+        # integers too large for a float make the whole conversion fail, so find them one at a time
+        return next(index for index, value in enumerate(values) if not __is_finite(value))
+    return None if finite.all() else int(numpy.argmin(finite))
+
+
+def __is_finite(value):
+    try:
+        value = float(value)
+    except (OverflowError, TypeError):
+        return False
+    return not math.isinf(value) and not math.isnan(value)
+
+
+def __array_property_check(property_schema):
+    """
+    Builds a predicate accepting values that certainly satisfy a schema of an array of numbers (or a string matching
+    its pattern, if the schema also allows strings), or None if the property schema is not simple enough.
+    """
+    if set(property_schema) - __array_property_keywords or not __is_number_array(property_schema):
+        return None
+
+    allows_string = 'string' in property_schema['type']
+    pattern = re.compile(property_schema['pattern']) if 'pattern' in property_schema else None
+    min_items = property_schema.get('minItems', 0)
+
+    def check(value):
+        if isinstance(value, list):
+            return len(value) >= min_items and __first_invalid_number(value) is None
+        if allows_string and isinstance(value, __string_types):
+            return pattern is None or pattern.search(value) is not None
+        return False
+
+    return check
+
+
+def __property_check(property_schema):
+    """
+    Builds a predicate accepting values that certainly satisfy a property schema, or None if the property schema is
+    not simple enough to be checked by hand.
+    """
+    if __is_number_array(property_schema):
+        return __array_property_check(property_schema)
+    if set(property_schema) - __flat_property_keywords:
+        return None
+
+    type_name = property_schema.get('type')
+    if type_name == 'number':
+        types = numbers.Real
+    elif type_name == 'integer':
+        types = __integer_types
+    elif type_name == 'boolean':
+        types = bool
+    else:
+        return None
+    enum = property_schema.get('enum')
+    minimum = property_schema.get('minimum')
+
+    def check(value):
+        if isinstance(value, bool) != (types is bool) or not isinstance(value, types):
+            return False
+        if enum is not None and value not in enum:
+            return False
+        return minimum is None or value >= minimum
+
+    return check
+
+
+def __flat_check(json_schema):
+    """
+    Builds a hand-written predicate for a flat object schema of scalar properties, such as fv_schema or pmt_schema.
+    The predicate returns True only for arguments that are certainly valid; anything else must go through the full
+    validator, which also produces the error message. Returns None for schemas the fast path does not support.
+    """
+    if set(json_schema) - __flat_schema_keywords:
+        return None
+    if json_schema.get('type') != 'object' or json_schema.get('additionalProperties') is not False:
+        return None
+
+    property_checks = {}
+    for name, property_schema in json_schema.get('properties', {}).items():
+        property_check = __property_check(property_schema)
+        if property_check is None:
+            return None
+        property_checks[name] = property_check
+
+    required = json_schema.get('required', [])
+    any_of = []
+    for subschema in json_schema.get('anyOf', []):
+        if set(subschema) != set(['required']):
+            return None
+        any_of.append(subschema['required'])
+
+    def check(arguments):
+        if not isinstance(arguments, dict):
+            return False
+        for name, value in arguments.items():
+            property_check = property_checks.get(name)
+            if property_check is None or not property_check(value):
+                return False
+        if any(name not in arguments for name in required):
+            return False
+        return not any_of or any(all(name in arguments for name in names) for names in any_of)
+
+    return check
+
+
+def get_fast_check(json_schema):
+    """
+    Returns the fast-path check for the given schema, or None if it has none, building it on first use.
+    """
+    key = id(json_schema)
+    cached = __fast_checks.get(key)
+    if cached is None:
+        cached = (json_schema, __flat_check(json_schema))
+        __fast_checks[key] = cached
+    return cached[1]
+
+
+def get_validator(json_schema):
+    """
+    Returns the validator for the given schema, checking and compiling the schema on first use.
+    """
+    key = id(json_schema)
+    cached = __validators.get(key)
+    if cached is None:
+        from jsonschema.validators import validator_for
+        cls = validator_for(json_schema)
+        cls.check_schema(json_schema)
+        cached = (json_schema, cls(json_schema))
+        __validators[key] = cached
+    return cached[1]
+
+
+def __number_array_error(arguments_json, json_schema):
+    """
+    Returns a ValidationError for the first element of an array of numbers property that is not a finite number,
+    with the property name and index as its path, or None if there is no such element.
+    """
+    if not isinstance(arguments_json, dict):
+        return None
+    for name, property_schema in json_schema.get('properties', {}).items():
+        values = arguments_json.get(name)
+        if not isinstance(values, list) or not __is_number_array(property_schema):
+            continue
+        index = __first_invalid_number(values)
+        if index is not None:
+            from jsonschema.exceptions import ValidationError
+            value = values[index]
+            if type(value) in __number_types:
+                message = "%r is not a finite number" % (value,)
+            else:
+                message = "%r is not of type %r" % (value, 'number')
+            return ValidationError(message, path=[name, index])
+
+
+def find_error(arguments_json, json_schema):
+    """
+    Validates the arguments against the schema. Returns the most relevant ValidationError, or None if they are valid.
+    Arrays of numbers are checked in a single vectorized pass, and the first element that is not a finite number is
+    reported, with its index in the error's path.
+    """
+    fast_check = get_fast_check(json_schema)
+    if fast_check is not None and fast_check(arguments_json):
+        return None
+
+    error = __number_array_error(arguments_json, json_schema)
+    if error is not None:
+        return error
+
+    from jsonschema.exceptions import best_match
+    return best_match(get_validator(json_schema).iter_errors(arguments_json))
+
+
+def compile_schemas(json_schemas):
+    """
+    Builds the fast-path checks and compiles the validators of all the given schemas ahead of their first use.
+    """
+    for json_schema in json_schemas:
+        get_fast_check(json_schema)
+        get_validator(json_schema)
@@ -69,11 +69,15 @@ npv_schema = {
             "type": "number"
         },
         "values": {
-            "type": "array",
+            "type": ["array", "string"],
+            "pattern": "^[A-Za-z0-9+/]*={0,2}$",
             "items": {
                 "type": "number",
                 "minItems": 1
             }
+        },
+        "analytics": {
+            "type": "boolean"
         }
     },
     "required": ["rate", "values"],
@@ -136,11 +140,16 @@ irr_schema = {
     "type": "object",
     "properties": {
         "values": {
-            "type": "array",
+            "type": ["array", "string"],
+            "pattern": "^[A-Za-z0-9+/]*={0,2}$",
             "items": {
                 "type": "number"
             },
             "minItems": 2
+        },
+        "window": {
+            "type": "integer",
+            "minimum": 2
         }
     },
     "required": ["values"],
@@ -151,7 +160,8 @@ mirr_schema = {
     "type": "object",
     "properties": {
         "values": {
-            "type": "array",
+            "type": ["array", "string"],
+            "pattern": "^[A-Za-z0-9+/]*={0,2}$",
             "items": {
                 "type": "number"
             },
@@ -232,3 +242,187 @@ rate_schema = {
     ],
     "additionalProperties": False
 }
+
+amortization_schema = {
+    "type": "object",
+    "properties": {
+        "rate": {
+            "type": "number"
+        },
+        "nper": {
+            "type": "integer",
+            "minimum": 1
+        },
+        "pv": {
+            "type": "number"
+        },
+        "fv": {
+            "type": "number"
+        },
+        "type": {
+            "type": "integer",
+            "enum": [0, 1]
+        },
+        "start_period": {
+            "type": "integer",
+            "minimum": 1
+        },
+        "end_period": {
+            "type": "integer",
+            "minimum": 1
+        }
+    },
+    "required": ["rate", "nper", "pv"],
+    "additionalProperties": False
+}
+
+batch_schema = {
+    "type": "object",
+    "properties": {
+        "batch": {
+            "type": ["array", "object"],
+            "additionalProperties": {
+                "type": "array"
+            }
+        },
+        "encoding": {
+            "enum": ["base64"]
+        }
+    },
+    "required": ["batch"],
+    "additionalProperties": False
+}
+
+router_schema = {
+    "type": "object",
+    "properties": {
+        "function": {
+            "type": "string"
+        },
+        "calls": {
+            "type": "array",
+            "items": {
+                "type": "object"
+            }
+        }
+    },
+    "oneOf": [
+        {
+            "required": ["function"]
+        },
+        {
+            "required": ["calls"]
+        }
+    ]
+}
+
+
+grid_schema = {
+    "type": "object",
+    "properties": {
+        "grid": {
+            "type": "object",
+            "minProperties": 1,
+            "additionalProperties": {
+                "type": "array",
+                "minItems": 1,
+                "items": {
+                    "type": "number"
+                }
+            }
+        },
+        "axes": {
+            "type": "array",
+            "items": {
+                "type": "string"
+            }
+        }
+    },
+    "required": ["grid"]
+}
+
+
+iso_date_schema = {
+    "type": "string",
+    "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"
+}
+
+npv_rates_schema = {
+    "type": ["number", "array"],
+    "items": {
+        "type": "number"
+    },
+    "minItems": 1,
+    "maxItems": 16
+}
+
+cash_flow_schema = {
+    "type": "object",
+    "properties": {
+        "value": {
+            "type": "number"
+        },
+        "period": {
+            "type": "number"
+        },
+        "date": iso_date_schema
+    },
+    "required": ["value"],
+    "oneOf": [
+        {
+            "required": ["period"]
+        },
+        {
+            "required": ["date"]
+        }
+    ],
+    "additionalProperties": False
+}
+
+npv_update_schema = {
+    "type": "object",
+    "properties": {
+        "rates": npv_rates_schema,
+        "start_date": iso_date_schema,
+        "state": {
+            "type": "object",
+            "properties": {
+                "rates": npv_rates_schema,
+                "start_date": {
+                    "anyOf": [iso_date_schema, {"type": "null"}]
+                },
+                "periodic": {
+                    "type": ["boolean", "null"]
+                },
+                "sums": {
+                    "type": "array",
+                    "items": {
+                        "type": "number"
+                    }
+                },
+                "count": {
+                    "type": "integer",
+                    "minimum": 0
+                }
+            },
+            "required": ["rates", "sums", "count"]
+        },
+        "append": {
+            "type": "array",
+            "items": cash_flow_schema
+        },
+        "remove": {
+            "type": "array",
+            "items": cash_flow_schema
+        }
+    },
+    "oneOf": [
+        {
+            "required": ["rates"]
+        },
+        {
+            "required": ["state"]
+        }
+    ],
+    "additionalProperties": False
+}
@@ -0,0 +1,57 @@
+import io
+import json
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+import bulk_runner
+
+PMT_CSV = '''rate,nper,pv,fv,type
+0.00625,180,200000,,
+0.00625,180,200000,300000,1
+0.00625,,200000,,
+0.00625,180,200000,300000,
+'''
+
+
+def test_run_csv():
+    output_file = io.StringIO()
+    counts = bulk_runner.run('pmt', io.StringIO(PMT_CSV), output_file, 'csv', chunk_size=3)
+    assert counts == {'rows': 4, 'errors': 1}
+
+    lines = output_file.getvalue().splitlines()
+    assert lines[0] == 'rate,nper,pv,fv,type,result,error'
+    assert [round(float(line.split(',')[5]), 6) for line in [lines[1], lines[2], lines[4]]] == [-1854.02472, -2742.918559, -2760.0618]
+    assert lines[3].endswith(",'nper' is a required property")
+
+
+def test_run_jsonl():
+    input_file = io.StringIO('\n'.join([
+        json.dumps({"values": [-100, 39, 59, 55, 20]}),
+        '',
+        json.dumps({"values": [-100, -200]})
+    ]))
+    output_file = io.StringIO()
+    counts = bulk_runner.run('irr', input_file, output_file, 'jsonl', chunk_size=1)
+    assert counts == {'rows': 2, 'errors': 1}
+
+    outputs = [json.loads(line) for line in output_file.getvalue().splitlines()]
+    assert round(outputs[0]['result'], 5) == 0.28095
+    assert outputs[0]['values'] == [-100, 39, 59, 55, 20]
+    assert outputs[1]['error'] == "IRR requires at least one positive and one negative value"
+
+
+def test_run_processes_keeps_order():
+    rows = ['rate,nper,pv'] + ['0.01,{},1000'.format(nper) for nper in range(1, 101)]
+    output_file = io.StringIO()
+    bulk_runner.run('pmt', io.StringIO('\n'.join(rows)), output_file, 'csv', chunk_size=7, processes=2)
+    lines = output_file.getvalue().splitlines()[1:]
+    assert [int(line.split(',')[1]) for line in lines] == list(range(1, 101))
+
+
+def test_parse_number():
+    assert bulk_runner.parse_number('1') == 1
+    assert bulk_runner.parse_number('0.5') == 0.5
+    assert bulk_runner.parse_number('x') == 'x'
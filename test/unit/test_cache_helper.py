@@ -0,0 +1,61 @@
+import pytest
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+import cache_helper
+
+
+def test_get_put():
+    cache = cache_helper.LRUCache(2, 300)
+    assert cache.get('a') is cache_helper.MISSING
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0}
+
+
+def test_evicts_least_recently_used():
+    cache = cache_helper.LRUCache(2, 300)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    assert cache.put('c', 3) == 1
+    assert cache.get('b') is cache_helper.MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_bounded_by_weight():
+    cache = cache_helper.LRUCache(10, 300, weigh=len)
+    cache.put('a', [1] * 4)
+    cache.put('b', [1] * 4)
+    assert cache.put('c', [1] * 4) == 1
+    assert cache.get('a') is cache_helper.MISSING
+    assert cache.weight == 8
+    cache.put('b', [1])
+    assert cache.weight == 5
+    # a value heavier than the whole cache is not kept
+    cache.put('d', [1] * 11)
+    assert cache.stats()['size'] == 0 and cache.weight == 0
+
+
+def test_expires_entries():
+    cache = cache_helper.LRUCache(2, 0)
+    cache.put('a', 1)
+    assert cache.get('a') is cache_helper.MISSING
+    assert cache.expirations == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_from_environment(monkeypatch):
+    monkeypatch.delenv('RESULT_CACHE_SIZE', raising=False)
+    assert cache_helper.from_environment() is None
+
+    monkeypatch.setenv('RESULT_CACHE_SIZE', '100')
+    monkeypatch.setenv('RESULT_CACHE_TTL', '60')
+    cache = cache_helper.from_environment()
+    assert cache.max_size == 100
+    assert cache.ttl == 60
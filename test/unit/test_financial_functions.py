@@ -5,13 +5,33 @@ import sys, os
 my_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, my_path + '/../../code/')
 
-from datetime import date
+import array
+from datetime import date, datetime, timedelta
+import numpy as np
 import financial_functions as ff
 
 def test_fvschedule():
     assert ff.fvschedule(10000, [0.05, 0.05, 0.035, 0.035, 0.035]) == 12223.614571875
     assert ff.fvschedule(100, [0.04, 0.06, 0.05]) == 115.752
     
+def test_fvschedule_many():
+    assert round(ff.fvschedule_many(100, [0.04, 0.06, 0.05]), 9) == 115.752
+    assert np.allclose(ff.fvschedule_many([100, 200], [0.04, 0.06, 0.05]), [115.752, 231.504])
+    assert np.allclose(ff.fvschedule_many([10000, 100], [[0.05, 0.05, 0.035, 0.035, 0.035], [0.04, 0.06, 0.05, 0, 0]]),
+                       [12223.614571875, 115.752])
+
+def test_fvschedule_many_path():
+    assert np.allclose(ff.fvschedule_many(100, [0.04, 0.06, 0.05], path=True), [104, 110.24, 115.752])
+    assert np.allclose(ff.fvschedule_many([100, 200], [0.04, 0.06, 0.05], path=True),
+                       [[104, 110.24, 115.752], [208, 220.48, 231.504]])
+    assert np.allclose(ff.fvschedule_many([100, 200], [[0.04, 0.06, 0.05], [0, 0, 0.1]], path=True),
+                       [[104, 110.24, 115.752], [200, 200, 220]])
+
+def test_fvschedule_many_matches_fvschedule():
+    schedules = np.random.RandomState(0).uniform(0, 0.001, (50, 365))
+    expected = [ff.fvschedule(1000, list(schedule)) for schedule in schedules]
+    assert np.allclose(ff.fvschedule_many(np.full(50, 1000), schedules), expected)
+
 def test_xnpv():
     assert ff.xnpv(
         0.05,
@@ -43,22 +63,108 @@ def test_xnpv_dates_not_chronological_order():
             [date(2016, 2, 1), date(2016, 1, 1)])
     
 def test_xirr():
-    assert ff.xirr(
+    assert round(ff.xirr(
         [-100, 20, 40, 25],
         [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1)]
-    ) == -0.19674386129832788
+    ), 12) == -0.196743861298
     
-    assert ff.xirr(
+    assert round(ff.xirr(
         [-100, 20, 40, 25, 8, 15],
         [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1), date(2017, 3, 1), date(2017, 6, 1)]
-    ) == 0.0944390744445201
+    ), 12) == 0.094439074445
     
-    assert ff.xirr(
+    assert round(ff.xirr(
         [-1000, 300, 400, 400, 300],
         [date(2011, 12, 1), date(2012, 1, 1), date(2013, 2, 1), date(2014, 3, 1), date(2015, 4, 1)],
         0.1
-    ) == 0.23860325587217
+    ), 12) == 0.238603255872
     
+def test_xnpv_long_schedule():
+    values = [-1000000] + [1500] * 3000
+    dates = [date(2000, 1, 1) + timedelta(days=7 * i) for i in range(3001)]
+    expected = sum([value / (1.08 ** ((d - dates[0]).days / 365.0)) for (value, d) in zip(values, dates)])
+    assert round(ff.xnpv(0.08, values, dates), 6) == round(expected, 6)
+
+def test_xirr_long_schedule():
+    values = [-1000000] + [1500] * 3000
+    dates = [date(2000, 1, 1) + timedelta(days=7 * i) for i in range(3001)]
+    assert abs(ff.xnpv(ff.xirr(values, dates), values, dates)) < 1e-6
+
+def test_xnpv_xirr_array_inputs():
+    values = [-1000000] + [1500] * 3000
+    dates = [date(2000, 1, 1) + timedelta(days=7 * i) for i in range(3001)]
+    days = np.array(dates, dtype='datetime64[D]')
+    expected = ff.xnpv(0.08, values, dates)
+    assert ff.xnpv(0.08, np.array(values, dtype=float), days) == expected
+    # buffers such as the data of Arrow float64 and date32 columns
+    buffer_values = array.array('d', values)
+    buffer_days = array.array('i', days.astype(np.int32))
+    assert ff.xnpv(0.08, memoryview(buffer_values), memoryview(buffer_days)) == expected
+    assert ff.xirr(buffer_values, buffer_days) == ff.xirr(values, dates)
+
+def test_days_of_date_objects():
+    dates = [date(1969, 12, 31), date(2016, 2, 29), datetime(2017, 3, 1, 12)]
+    days = getattr(ff, '__days')
+    assert days(dates).tolist() == [-1, 16860, 17226]
+    assert days(tuple(dates)).tolist() == days(['1969-12-31', '2016-02-29', '2017-03-01']).tolist()
+
+def test_schedule_does_not_copy_values():
+    values = np.array([-100, 20, 40, 25], dtype=float)
+    days = np.array(['2016-01-01', '2016-04-01', '2016-10-01', '2017-02-01'], dtype='datetime64[D]')
+    schedule_values, years = getattr(ff, '__schedule')(values, days)
+    assert np.shares_memory(schedule_values, values)
+    assert np.allclose(years, [0, 91 / 365.0, 274 / 365.0, 397 / 365.0])
+
+def test_xnpv_array_dates_not_chronological_order():
+    with pytest.raises(ValueError):
+        ff.xnpv(0.05, np.array([-100, 20], dtype=float), np.array(['2016-04-01', '2016-01-01'], dtype='datetime64[D]'))
+
+@pytest.mark.parametrize("day_count, years", [
+    ('ACT/365F', [0, 60 / 365.0, 366 / 365.0, 547 / 365.0]),
+    ('ACT/360', [0, 60 / 360.0, 366 / 360.0, 547 / 360.0]),
+    ('30/360', [0, 60 / 360.0, 360 / 360.0, 540 / 360.0]),
+    ('ACT/ACT ISDA', [0, 60 / 366.0, 336 / 366.0 + 30 / 365.0, 336 / 366.0 + 211 / 365.0]),
+])
+def test_day_counts(day_count, years):
+    dates = [date(2016, 1, 31), date(2016, 3, 31), date(2017, 1, 31), date(2017, 7, 31)]
+    values = [-100, 10, 10, 90]
+    assert np.allclose(getattr(ff, '__schedule_years')(dates, day_count), years, rtol=0, atol=1e-14)
+    assert ff.xnpv(0.05, values, dates, day_count) == pytest.approx(sum(v / 1.05 ** t for v, t in zip(values, years)))
+    rate = ff.xirr(values, dates, day_count=day_count)
+    assert abs(ff.xnpv(rate, values, dates, day_count)) < 1e-9
+    assert np.allclose(ff.xirr_many(values * 2, dates * 2, [0, 4, 8], day_count=day_count), rate)
+    assert ff.rolling_xirr(values, dates, 4, day_count=day_count)[0] == pytest.approx(rate)
+
+def test_day_count_unknown():
+    with pytest.raises(ValueError):
+        ff.xnpv(0.05, [-100, 20], [date(2016, 1, 1), date(2016, 4, 1)], 'ACT/ACT')
+    with pytest.raises(ValueError):
+        ff.xirr_many([-100, 20], [date(2016, 1, 1), date(2016, 4, 1)], [0, 2], day_count='ACT/ACT')
+
+def test_rolling_xirr_30_360_windows():
+    values = [-100, -60, 20, 80, -30, 80, -10, 90]
+    # counted from 2016-02-28, 2016-03-31 is 33 days rather than the 60 - 28 it is counted from 2016-01-31
+    dates = [date(2016, 1, 31), date(2016, 2, 28), date(2016, 3, 31), date(2016, 5, 31), date(2016, 6, 28),
+             date(2016, 8, 31), date(2016, 10, 31), date(2016, 12, 31)]
+    rates = ff.rolling_xirr(values, dates, 4, day_count='30/360')
+    assert rates[1] == pytest.approx(ff.xirr(values[1:5], dates[1:5], day_count='30/360'))
+    assert abs(ff.xnpv(rates[1], values[1:5], dates[1:5], '30/360')) < 1e-9
+
+def test_schedule_years_cached_by_identity():
+    schedule_years = getattr(ff, '__schedule_years')
+    dates = [date(2016, 1, 1), date(2016, 4, 1)]
+    years = schedule_years(dates, 'ACT/365F')
+    assert schedule_years(dates, 'ACT/365F') is years
+    assert not years.flags.writeable
+    assert schedule_years(dates, 'ACT/360') is not years
+    # a schedule changed in place is converted again
+    dates[1] = date(2017, 1, 1)
+    assert schedule_years(dates, 'ACT/365F')[1] == 366 / 365.0
+    days = np.array(['2016-01-01', '2017-01-01'], dtype='datetime64[D]')
+    years = schedule_years(days, 'ACT/365F')
+    days[1] = np.datetime64('2018-01-01')
+    assert schedule_years(days, 'ACT/365F')[1] == 731 / 365.0
+
 def test_xirr_mismatched_lists():
     with pytest.raises(ValueError):
         ff.xirr([-100], [])
@@ -69,6 +175,231 @@ def test_xirr_dates_not_chronological_order():
             [-100, 20],
             [date(2016, 4, 1), date(2016, 1, 1)])
 
+def test_xirr_many():
+    rates = ff.xirr_many(
+        [-100, 20, 40, 25, -1000, 300, 400, 400, 300, 100, 200, -1, 100],
+        [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1),
+         date(2011, 12, 1), date(2012, 1, 1), date(2013, 2, 1), date(2014, 3, 1), date(2015, 4, 1),
+         date(2016, 1, 1), date(2017, 1, 1),
+         date(2015, 1, 1), date(2016, 1, 1)],
+        [0, 4, 9, 9, 11, 13])
+    assert round(rates[0], 12) == -0.196743861298
+    assert round(rates[1], 12) == 0.238603255872
+    # empty schedule and schedule without a negative value
+    assert np.isnan(rates[2])
+    assert np.isnan(rates[3])
+    # needs the bracketing fallback
+    assert round(rates[4], 8) == 99
+
+def test_xirr_many_matches_xirr():
+    values = [-100, 20, 40, 25, 8, 15]
+    dates = [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1), date(2017, 3, 1), date(2017, 6, 1)]
+    rates = ff.xirr_many(values * 3, dates * 3, [0, 6, 12, 18])
+    assert np.allclose(rates, ff.xirr(values, dates))
+
+def test_xirr_many_mismatched_lists():
+    with pytest.raises(ValueError):
+        ff.xirr_many([-100, 20], [date(2016, 1, 1)], [0, 2])
+
+def test_xirr_many_bad_offsets():
+    with pytest.raises(ValueError):
+        ff.xirr_many([-100, 20], [date(2016, 1, 1), date(2016, 4, 1)], [0, 1])
+
+def test_xirr_many_dates_not_chronological_order():
+    with pytest.raises(ValueError):
+        ff.xirr_many(
+            [-100, 20, -100, 20],
+            [date(2016, 1, 1), date(2016, 4, 1), date(2016, 4, 1), date(2016, 1, 1)],
+            [0, 2, 4])
+
+def test_irr():
+    assert round(ff.irr([-100, 39, 59, 55, 20]), 10) == 0.2809484212
+    assert round(ff.irr([-100, 39, 59, 55, 20], 0.5), 10) == 0.2809484212
+    assert round(ff.irr([100, -1]), 10) == -0.99
+    assert round(ff.irr([-1, 100]), 10) == 99
+
+def test_irr_inflows_before_outflows():
+    # the value-weighted guess is about -1 here, where Newton's steps shrink without reaching a root
+    values = [19, -27, 23, 36, -6, -5]
+    rate = ff.irr(values)
+    assert round(rate, 6) == -0.578175
+    assert abs(ff.npv(rate, values)) < 1e-9
+
+def test_irr_multiple_roots_nearest_zero():
+    # roots at about -0.463 and 0.369; numpy.irr returned the one nearest 0
+    values = [-44, 12, 4, 139, -74]
+    assert round(ff.irr(values), 6) == 0.369116
+    assert abs(ff.npv(ff.irr(values), values)) < 1e-9
+
+def test_irr_long_schedule():
+    # 30 year mortgage of 200000 at 0.5% a month
+    payment = 200000 * 0.005 / (1 - 1.005 ** -360)
+    assert round(ff.irr([-200000] + [payment] * 360), 12) == 0.005
+
+def test_irr_no_sign_change():
+    assert np.isnan(ff.irr([100, 200]))
+    assert np.isnan(ff.irr([-100, -200]))
+
+def test_fv():
+    assert round(ff.fv(0.004166666666667, 120, -100, -100, 1), 6) == 15757.629844
+    assert ff.fv(0, 10, -100, -1000) == 2000
+    assert np.allclose(ff.fv([0.004166666666667, 0], 120, -100, [-100, 0]), [15692.928894, 12000])
+
+def test_negative_growth_fractional_periods():
+    # a negative base to a fractional power is nan, as NumPy has it, on Python 2 as well as 3
+    assert np.isnan(ff.fv(-2, 0.5, 0, 100, 0))
+    assert np.isnan(ff.pmt(-2, 0.5, 100))
+    assert np.isnan(getattr(ff, '__power')(-1.0, 0.5))
+
+def test_pv():
+    assert round(ff.pv(0.004166666666666666, 120, -100, 15692.93, 1), 6) == -60.716775
+    assert ff.pv(0, 10, -100, 1000) == 0
+    assert np.allclose(ff.pv([0.004166666666666666, 0], 120, -100), [9428.135033, 12000])
+
+def test_pmt():
+    assert round(ff.pmt(0.00625, 180, 200000, 300000, 1), 6) == -2742.918559
+    assert ff.pmt(0, 10, 1000) == -100
+    assert ff.pmt(0.1, 0, 1000) == float('-inf')
+    assert np.allclose(ff.pmt(0.00625, [180, 1], 200000), [-1854.02472, -201250])
+
+def test_ipmt_ppmt():
+    assert round(ff.ppmt(0.10, 1, 3, 1000, 2000, 1), 6) == -914.858555
+    assert ff.ipmt(0.10, 1, 3, 1000, 0, 1) == 0
+    for per in range(1, 4):
+        assert round(ff.ipmt(0.10, per, 3, 1000) + ff.ppmt(0.10, per, 3, 1000), 10) == round(ff.pmt(0.10, 3, 1000), 10)
+    assert np.allclose(ff.ppmt(0.10, [1, 2, 3], 3, 1000), [-302.114804, -332.326284, -365.558912])
+
+def test_nper():
+    assert round(ff.nper(0.005833333333333, -150, 8000, -100, 1), 5) == 62.95762
+    assert ff.nper(0, -100, 1000) == 10
+    assert np.allclose(ff.nper([0.005833333333333, 0], -150, 8000), [64.07335, 53.33333333])
+
+def test_rate():
+    assert round(ff.rate(6, -200, 1000), 6) == 0.054718
+    assert round(ff.rate(6, -200, 1000, 0.10, 1), 6) == 0.079278
+    assert np.isnan(ff.rate(6, 0, 0))
+    assert np.allclose(ff.rate(6, -200, 1000, [0, 0.10], [0, 1]), [0.054718, 0.079278], atol=1e-6)
+
+def test_amortization():
+    for when in [0, 1]:
+        schedule = ff.amortization(0.10, 5, 1000, 200, when)
+        assert np.allclose(schedule['principal'] + schedule['interest'], ff.pmt(0.10, 5, 1000, 200, when))
+        assert np.allclose(schedule['principal'], ff.ppmt(0.10, schedule['period'], 5, 1000, 200, when))
+        assert np.allclose(schedule['balance'], 1000 + np.cumsum(schedule['principal']))
+
+def test_amortization_chunks():
+    chunks = list(ff.amortization_chunks(0.005, 360, 200000, chunk_size=100))
+    schedule = ff.amortization(0.005, 360, 200000)
+    assert [len(chunk['period']) for chunk in chunks] == [100, 100, 100, 60]
+    for column in schedule:
+        assert np.allclose(np.concatenate([chunk[column] for chunk in chunks]), schedule[column])
+
+def test_amortization_bad_periods():
+    with pytest.raises(ValueError):
+        ff.amortization(0.10, 2.5, 1000)
+    with pytest.raises(ValueError):
+        ff.amortization(0.10, 3, 1000, start_period=3, end_period=2)
+
+def test_rolling_irr_matches_irr():
+    # an outflow every 12 periods and inflows otherwise, so that windows starting with the outflow have one IRR
+    values = np.random.RandomState(0).uniform(50, 150, 120)
+    values[::12] = -800
+    for window in [2, 12, 36]:
+        rates = ff.rolling_irr(values, window)
+        assert len(rates) == len(values) - window + 1
+        for i in range(0, len(rates), 12):
+            assert abs(rates[i] - ff.irr(values[i:i + window])) < 1e-9
+
+def test_rolling_irr_roots():
+    values = np.random.RandomState(0).uniform(-100, 150, 120)
+    values[::12] -= 800
+    for window in [2, 12, 36]:
+        rates = ff.rolling_irr(values, window)
+        expected = np.array([ff.irr(values[i:i + window]) for i in range(len(rates))])
+        assert np.array_equal(np.isnan(rates), np.isnan(expected))
+        for i in np.flatnonzero(~np.isnan(rates)):
+            scale = ff.npv(rates[i], np.abs(values[i:i + window]))
+            assert abs(ff.npv(rates[i], values[i:i + window])) < 1e-9 * scale
+
+def test_rolling_irr_without_sign_change():
+    rates = ff.rolling_irr([-100, -50, 60, 70, 80], 2)
+    assert np.isnan(rates[0])
+    assert np.isnan(rates[2])
+    assert round(rates[1], 12) == 0.2
+
+def test_rolling_irr_bad_window():
+    with pytest.raises(ValueError):
+        ff.rolling_irr([-100, 50, 60], 4)
+
+def test_rolling_xirr():
+    values = [-100, 20, 40, 25, 8, 15, -30, 60]
+    dates = [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1), date(2017, 3, 1),
+             date(2017, 6, 1), date(2017, 7, 1), date(2017, 12, 1)]
+    rates = ff.rolling_xirr(values, dates, 4)
+    assert len(rates) == 5
+    for i, rate in enumerate(rates):
+        if not np.isnan(rate):
+            assert abs(ff.xnpv(rate, values[i:i + 4], dates[i:i + 4])) < 1e-6
+    assert round(rates[0], 12) == round(ff.xirr(values[:4], dates[:4]), 12)
+    # yearly dates make XIRR an IRR
+    yearly = np.datetime64('2000-01-01') + 365 * np.arange(len(values))
+    assert np.allclose(ff.rolling_xirr(values, yearly, 5), ff.rolling_irr(values, 5), equal_nan=True)
+
+def test_rolling_xirr_multiple_roots():
+    # -100, 230, -132 a year apart has roots 0.1 and 0.2; windows are seeded from the guess, as xirr is
+    values = [-100, 230, -132]
+    yearly = np.datetime64('2000-01-01') + 365 * np.arange(3)
+    for guess in [0.05, 0.19]:
+        assert ff.rolling_xirr(values, yearly, 3, guess=guess)[0] == pytest.approx(ff.xirr(values, yearly, guess=guess))
+    # given as many Newton steps as xirr, every window gets the root xirr finds
+    generator = np.random.RandomState(0)
+    values = generator.uniform(-100, 100, 200)
+    dates = np.datetime64('2000-01-01') + np.cumsum(generator.randint(30, 400, 200))
+    rates = ff.rolling_xirr(values, dates, 8, maxiter=50)
+    for i, rate in enumerate(rates):
+        try:
+            expected = ff.xirr(values[i:i + 8], dates[i:i + 8])
+        except RuntimeError:
+            continue
+        if abs(ff.xnpv(expected, values[i:i + 8], dates[i:i + 8])) < 1e-6:
+            assert rate == pytest.approx(expected, abs=1e-6)
+
+def test_npv():
+    assert round(ff.npv(0.1, [-1000, 3000, 4200, 6800]), 8) == 10307.28775357
+
+def test_npv_analytics():
+    values = [-1000, 300, 400, 400, 300]
+    analytics = ff.npv_analytics(0.1, values)
+    assert analytics['npv'] == ff.npv(0.1, values)
+    # against bump and reprice
+    bump = 1e-5
+    up, down = ff.npv(0.1 + bump, values), ff.npv(0.1 - bump, values)
+    derivative = (up - down) / (2 * bump)
+    second_derivative = (up - 2 * analytics['npv'] + down) / bump ** 2
+    assert abs(analytics['modified_duration'] - -derivative / analytics['npv']) < 1e-6
+    assert abs(analytics['macaulay_duration'] - analytics['modified_duration'] * 1.1) < 1e-12
+    assert abs(analytics['convexity'] - second_derivative / analytics['npv']) < 1e-3
+    assert abs(analytics['dv01'] - -derivative * 0.0001) < 1e-8
+
+def test_npv_analytics_zero_npv():
+    analytics = ff.npv_analytics(0, [-100, 100])
+    assert analytics['npv'] == 0
+    assert np.isinf(analytics['macaulay_duration'])
+    assert analytics['dv01'] == 0.01
+
+def test_xnpv_analytics():
+    values = [-100, 20, 40, 25]
+    dates = [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1)]
+    analytics = ff.xnpv_analytics(0.05, values, dates)
+    assert analytics['npv'] == ff.xnpv(0.05, values, dates)
+    bump = 1e-6
+    derivative = (ff.xnpv(0.05 + bump, values, dates) - ff.xnpv(0.05 - bump, values, dates)) / (2 * bump)
+    assert abs(analytics['dv01'] - -derivative * 0.0001) < 1e-8
+
+def test_mirr():
+    assert round(ff.mirr([-1000, 300, 400, 400, 300], 0.12, 0.10), 10) == 0.1287550261
+    assert np.isnan(ff.mirr([100, 200], 0.12, 0.10))
+
 def test_effect():
     assert ff.effect(.12, 12) == 0.12682503013196977
     assert ff.effect(.10, 4) == 0.10381289062499954
@@ -1,3 +1,4 @@
+import base64
 import json
 
 # make sure we can find the app code
@@ -5,7 +6,9 @@ import sys, os
 my_path = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, my_path + '/../../code/')
 
+import cache_helper
 import lambda_handlers as handlers
+import numpy as np
 
 REQUIRED_PROPERTY_ERR = "'{}' is a required property"
 INCORRECT_TYPE_ERR = "'{}' is not of type '{}'"
@@ -156,6 +159,39 @@ def test_irr_values_wrong_type():
     assert response.get('error') == INCORRECT_TYPE_ERR.format("test1", "number")
 
 
+def test_irr_handler_roots():
+    assert round(handlers.irr_handler({"values": [19, -27, 23, 36, -6, -5]}, None)['result'], 6) == -0.578175
+    assert round(handlers.irr_handler({"values": [-44, 12, 4, 139, -74]}, None)['result'], 6) == 0.369116
+
+
+def test_irr_handler_window():
+    response = handlers.irr_handler({
+        "values": [-100, -50, 60, 70, 80],
+        "window": 2
+    }, None)
+    result = response.get('result')
+    assert result[0] is None and result[2] is None
+    assert round(result[1], 12) == 0.2
+
+
+def test_irr_handler_window_stalled_newton():
+    values = [19, -27, 23, 36, -6, -5, 1]
+    response = handlers.irr_handler({"values": values, "window": 6}, None)
+    result = response.get('result')
+    assert round(result[0], 3) == -0.578
+    assert round(result[1], 3) == 0.569
+    for rate, window in zip(result, [values[:6], values[1:]]):
+        assert abs(sum(value / (1 + rate) ** period for period, value in enumerate(window))) < 1e-9
+
+
+def test_irr_handler_window_too_long():
+    response = handlers.irr_handler({
+        "values": [-100, 60, 70],
+        "window": 4
+    }, None)
+    assert response.get('error') == "IRR requires window <= the number of values"
+
+
 def test_irr_values_too_few():
     response = handlers.irr_handler({
         "values": [100]
@@ -326,13 +362,168 @@ def test_nper_missing_pv():
 def test_npv_handler():
     # TODO test data types
 
-    # TODO Why doesn't the Excel calc match the NumPy calc?
+    # Unlike Excel, which discounts the first value too, NPV follows the NumPy convention of not discounting it
     response = handlers.npv_handler({
         "rate": 0.1,
         "values": [-1000, 3000, 4200, 6800]
     }, None)
     assert 'result' in response
-    assert round(response.get('result'), 8) == 1188.44341
+    assert round(response.get('result'), 8) == 10307.28775357
+
+
+def test_npv_handler_analytics():
+    response = handlers.npv_handler({
+        "rate": 0.1,
+        "values": [-1000, 3000, 4200, 6800],
+        "analytics": True
+    }, None)
+    result = response.get('result')
+    assert set(result) == set(['npv', 'macaulay_duration', 'modified_duration', 'convexity', 'dv01'])
+    assert round(result['npv'], 8) == 10307.28775357
+    assert round(result['dv01'], 8) == round(-0.0001 * (handlers.npv_handler({
+        "rate": 0.1 + 1e-6, "values": [-1000, 3000, 4200, 6800]}, None)['result'] - handlers.npv_handler({
+        "rate": 0.1 - 1e-6, "values": [-1000, 3000, 4200, 6800]}, None)['result']) / 2e-6, 8)
+
+
+def test_npv_handler_analytics_rate_minus_one():
+    result = handlers.npv_handler({"rate": -1, "values": [1, 2], "analytics": True}, None)['result']
+    assert result['npv'] == handlers.npv_handler({"rate": -1, "values": [1, 2]}, None)['result'] == float('inf')
+    assert result['dv01'] == float('inf')
+
+
+def test_npv_handler_analytics_batch():
+    response = handlers.npv_handler({"batch": [
+        {"rate": 0.1, "values": [-1000, 3000, 4200, 6800], "analytics": True},
+        {"rate": 0.1, "values": [-1000, 3000, 4200, 6800]},
+        {"rate": 0.1, "values": [-1000, 3000], "analytics": "yes"}
+    ]}, None)
+    results = response.get('results')
+    assert results[0]['result']['npv'] == results[1]['result']
+    assert 'error' in results[2]
+
+
+def test_npv_update_handler():
+    response = handlers.npv_update_handler({
+        "rates": 0.1,
+        "append": [{"value": -1000, "period": 0}, {"value": 3000, "period": 1}]
+    }, None)
+    response = handlers.npv_update_handler({
+        "state": response['result']['state'],
+        "append": [{"value": 4200, "period": 2}, {"value": 6800, "period": 3}, {"value": 1, "period": 4}],
+        "remove": [{"value": 1, "period": 4}]
+    }, None)
+    result = response.get('result')
+    assert round(result['npv'], 8) == 10307.28775357
+    assert result['state']['count'] == 4
+
+
+def test_npv_update_handler_dates():
+    response = handlers.npv_update_handler({
+        "rates": [0.05, 0.1],
+        "append": [{"value": -100, "date": "2016-01-01"}, {"value": 20, "date": "2016-04-01"}]
+    }, None)
+    result = response.get('result')
+    assert result['state']['start_date'] == '2016-01-01'
+    assert round(result['npv'][0], 8) == round(-100 + 20 / 1.05 ** (91 / 365.0), 8)
+    assert round(result['npv'][1], 8) == round(-100 + 20 / 1.1 ** (91 / 365.0), 8)
+
+
+def test_npv_update_handler_errors():
+    assert handlers.npv_update_handler({
+        "rates": 0.1,
+        "append": [{"value": -100, "date": "2016-01-01"}, {"value": 20, "period": 1}]
+    }, None) == {'error': "NPV update requires flows all placed at a period or all at a date"}
+    assert handlers.npv_update_handler({
+        "rates": 0.1,
+        "remove": [{"value": 20, "period": 1}]
+    }, None) == {'error': "NPV update cannot remove more flows than were appended"}
+    assert handlers.npv_update_handler({
+        "rates": 0.1,
+        "append": [{"value": 20, "date": "2016-02-30"}]
+    }, None) == {'error': "NPV update requires valid dates"}
+    assert handlers.npv_update_handler({"rates": -1}, None) == {'error': "NPV update requires rates greater than -1"}
+    assert 'error' in handlers.npv_update_handler({"append": [{"value": 20, "period": 1}]}, None)
+    state = handlers.npv_update_handler({"rates": 0.1, "start_date": "2016-01-01"}, None)['result']['state']
+    state['start_date'] = "2016-02-30"
+    assert handlers.npv_update_handler({"state": state}, None) == {'error': "NPV update requires valid dates"}
+
+
+def test_npv_update_handler_overflow():
+    response = handlers.npv_update_handler({"rates": -0.5, "append": [{"value": 20, "period": 2000}]}, None)
+    assert response['result']['npv'] == float('inf')
+    response = handlers.npv_update_handler({"rates": 0.1, "append": [{"value": 20, "period": -1e6}]}, None)
+    assert response['result']['npv'] == float('inf')
+
+
+def encode(values):
+    return base64.b64encode(np.asarray(values, dtype='<f8').tobytes()).decode('ascii')
+
+
+def test_npv_handler_base64_values():
+    response = handlers.npv_handler({
+        "rate": 0.1,
+        "values": encode([-1000, 3000, 4200, 6800])
+    }, None)
+    assert round(response.get('result'), 8) == 10307.28775357
+
+
+def test_irr_mirr_handlers_base64_values():
+    values = encode([-100, 39, 59, 55, 20])
+    assert round(handlers.irr_handler({"values": values}, None).get('result'), 5) == 0.28095
+    assert round(handlers.mirr_handler({
+        "values": values, "finance_rate": 0.12, "reinvest_rate": 0.1}, None).get('result'), 5) == 0.19481
+    assert handlers.irr_handler({"values": encode([100, 200])}, None) == {
+        'error': "IRR requires at least one positive and one negative value"}
+    assert handlers.irr_handler({"values": encode([-100, 39, float('nan'), 55])}, None) == {
+        'error': "IRR requires finite values, values[2] is nan"}
+
+
+def test_irr_values_not_finite():
+    response = handlers.irr_handler({
+        "values": [-100, 39, float('inf'), 55]
+    }, None)
+    assert response.get('error') == "inf is not a finite number"
+    assert handlers.npv_handler({"rate": 0.1, "values": [-100, 10 ** 400]}, None) == {
+        'error': "%r is not a finite number" % 10 ** 400}
+
+
+def test_base64_values_errors():
+    assert handlers.npv_handler({"rate": 0.1, "values": "AAAA"}, None) == {
+        'error': "NPV requires base64 values encoding a whole number of float64"}
+    assert 'error' in handlers.npv_handler({"rate": 0.1, "values": "not base64!"}, None)
+    values = "A" * 31 + "\n"
+    assert handlers.npv_handler({"rate": 0.1, "values": values}, None) == {
+        'error': "NPV requires base64 values encoding a whole number of float64"}
+    assert handlers.irr_handler({"values": values}, None) == {
+        'error': "IRR requires base64 values encoding a whole number of float64"}
+    assert handlers.mirr_handler({"values": values, "finance_rate": 0.1, "reinvest_rate": 0.1}, None) == {
+        'error': "MIRR requires base64 values encoding a whole number of float64"}
+    results = handlers.npv_handler({"batch": [{"rate": 0.1, "values": values}, {"rate": 0.1, "values": [1, 2]}]},
+                                   None)['results']
+    assert 'error' in results[0] and results[1] == {'result': 2.8181818181818183}
+
+
+def test_batch_base64_results():
+    response = handlers.pmt_handler({
+        "batch": [
+            {"rate": 0.00625, "nper": 180, "pv": 200000},
+            {"rate": 0.00625, "nper": 180},
+            {"rate": 0.00625, "nper": 180, "pv": 200000, "fv": 300000}
+        ],
+        "encoding": "base64"
+    }, None)
+    results = np.frombuffer(base64.b64decode(response['results']), dtype='<f8')
+    assert [round(value, 6) for value in results[[0, 2]]] == [-1854.02472, -2760.0618]
+    assert np.isnan(results[1])
+    assert response['errors'] == [{'index': 1, 'error': REQUIRED_PROPERTY_ERR.format("pv")}]
+
+
+def test_batch_base64_results_not_numbers():
+    response = handlers.amortization_handler({
+        "batch": [{"rate": 0.1, "nper": 3, "pv": 1000}],
+        "encoding": "base64"
+    }, None)
+    assert response == {'error': "Amortization results cannot be encoded as base64"}
 
 
 def test_npv_missing_rate():
@@ -547,3 +738,262 @@ def test_rate_missing_pv():
 
     assert 'error' in response
 
+
+
+def test_pmt_batch_handler():
+    response = handlers.pmt_handler({
+        "batch": [
+            {"rate": 0.00625, "nper": 180, "pv": 200000},
+            {"rate": 0.00625, "nper": 180, "pv": 200000, "fv": 300000},
+            {"rate": 0.00625, "nper": 180, "pv": 200000, "fv": 300000, "type": 1}
+        ]
+    }, None)
+    assert 'results' in response
+    assert [round(item.get('result'), 6) for item in response.get('results')] == [-1854.02472, -2760.06180, -2742.918559]
+
+
+def test_fv_batch_handler_columns():
+    response = handlers.fv_handler({
+        "batch": {
+            "rate": [0.004166666666667, 0.004166666666667],
+            "nper": [120, 120],
+            "pmt": [-100, -100],
+            "pv": [0, -100]
+        }
+    }, None)
+    assert 'results' in response
+    assert [round(item.get('result'), 6) for item in response.get('results')] == [15528.227945, 15692.928894]
+
+
+def test_batch_columns_mismatched_lengths():
+    response = handlers.fv_handler({
+        "batch": {
+            "rate": [0.004166666666667, 0.004166666666667],
+            "nper": [120]
+        }
+    }, None)
+    assert response.get('error') == "batch columns must all be the same length"
+
+
+def test_batch_wrong_type():
+    response = handlers.pmt_handler({"batch": 5}, None)
+    assert 'error' in response
+
+
+def test_batch_item_errors():
+    response = handlers.pmt_handler({
+        "batch": [
+            {"rate": 0.00625, "nper": 180},
+            {"rate": 0.00625, "nper": 180, "pv": 200000},
+            {"rate": 0.00625, "pv": 200000}
+        ]
+    }, None)
+    results = response.get('results')
+    assert results[0] == {'error': REQUIRED_PROPERTY_ERR.format("pv")}
+    assert round(results[1].get('result'), 6) == -1854.02472
+    assert results[2] == {'error': REQUIRED_PROPERTY_ERR.format("nper")}
+
+
+def test_irr_batch_handler():
+    response = handlers.irr_handler({
+        "batch": [
+            {"values": [-100, 39, 59, 55, 20]},
+            {"values": [-100, -200]}
+        ]
+    }, None)
+    results = response.get('results')
+    assert round(results[0].get('result'), 5) == 0.28095
+    assert results[1] == {'error': "IRR requires at least one positive and one negative value"}
+
+
+def test_pmt_grid_handler():
+    response = handlers.pmt_handler({
+        "grid": {"rate": [0.00625, 0.005], "nper": [120, 180, 360]},
+        "axes": ["rate", "nper"],
+        "pv": 200000
+    }, None)
+    result = response.get('result')
+    assert result['axes'] == ['rate', 'nper']
+    assert len(result['values']) == 2 and len(result['values'][0]) == 3
+    for i, rate in enumerate([0.00625, 0.005]):
+        for j, nper in enumerate([120, 180, 360]):
+            expected = handlers.pmt_handler({"rate": rate, "nper": nper, "pv": 200000}, None)['result']
+            assert round(result['values'][i][j], 8) == round(expected, 8)
+
+
+def test_fv_grid_handler_default_axes():
+    response = handlers.fv_handler({
+        "grid": {"rate": [0.004166666666667], "pv": [0, -100]},
+        "nper": 120,
+        "pmt": -100
+    }, None)
+    assert response['result']['axes'] == ['pv', 'rate']
+    assert [[round(value, 6) for value in row] for row in response['result']['values']] == [[15528.227945], [15692.928894]]
+
+
+def test_grid_errors():
+    assert handlers.pmt_handler({
+        "grid": {"rate": [0.01, 0.02]},
+        "nper": 10
+    }, None) == {'error': REQUIRED_PROPERTY_ERR.format("pv")}
+    assert handlers.pv_handler({
+        "grid": {"rate": [0.01], "type": [0, 2]},
+        "nper": 10,
+        "pmt": -100
+    }, None) == {'error': "2 is not one of [0, 1]"}
+    assert handlers.pv_handler({
+        "grid": {"rate": [0.01]},
+        "axes": ["nper"],
+        "nper": 10,
+        "pmt": -100
+    }, None) == {'error': "axes must name every axis of the grid once"}
+    assert 'error' in handlers.pmt_handler({"grid": {"rate": []}, "nper": 10, "pv": 100}, None)
+    assert 'error' in handlers.pmt_handler({"grid": {"rate": [0.01] * 1000, "nper": list(range(1, 1001))}, "pv": 100}, None)
+
+
+def test_amortization_handler():
+    response = handlers.amortization_handler({
+        "rate": 0.10,
+        "nper": 3,
+        "pv": 1000
+    }, None)
+    assert 'result' in response
+    schedule = response.get('result')
+    assert schedule.get('period') == [1, 2, 3]
+    assert [round(value, 6) for value in schedule.get('principal')] == [-302.114804, -332.326284, -365.558912]
+    assert [round(value, 6) for value in schedule.get('interest')] == [-100, -69.78852, -36.555891]
+    assert [round(value, 6) for value in schedule.get('balance')] == [697.885196, 365.558912, 0]
+
+
+def test_amortization_handler_page():
+    response = handlers.amortization_handler({
+        "rate": 0.00625,
+        "nper": 180,
+        "pv": 200000,
+        "start_period": 171,
+        "end_period": 180
+    }, None)
+    schedule = response.get('result')
+    assert schedule.get('period') == list(range(171, 181))
+    assert round(schedule.get('balance')[-1], 6) == 0
+
+
+def test_amortization_periods_out_of_range():
+    response = handlers.amortization_handler({
+        "rate": 0.10,
+        "nper": 3,
+        "pv": 1000,
+        "end_period": 4
+    }, None)
+    assert response.get('error') == "Amortization requires start_period <= end_period <= nper"
+
+
+def test_amortization_too_many_periods():
+    response = handlers.amortization_handler({
+        "rate": 0.000001,
+        "nper": 10 ** 7,
+        "pv": 1000
+    }, None)
+    assert response.get('error') == \
+        "Amortization returns at most 10000 periods, use start_period and end_period to fetch pages"
+    response = handlers.amortization_handler({
+        "rate": 0.000001,
+        "nper": 10 ** 7,
+        "pv": 1000,
+        "start_period": 10 ** 7 - 9999
+    }, None)
+    schedule = response.get('result')
+    assert len(schedule['period']) == 10000
+    assert all(type(period) is int for period in schedule['period'])
+
+
+def test_amortization_missing_nper():
+    response = handlers.amortization_handler({
+        "rate": 0.10,
+        "pv": 1000
+    }, None)
+    assert response.get('error') == REQUIRED_PROPERTY_ERR.format("nper")
+
+
+def test_pmt_result_cache(monkeypatch):
+    cache = cache_helper.LRUCache(10, 300)
+    monkeypatch.setattr(handlers, '__result_cache', cache)
+
+    first = handlers.pmt_handler({"rate": 0.00625, "nper": 180, "pv": 200000}, None)
+    second = handlers.pmt_handler({"rate": 0.00625, "nper": 180.0, "pv": 200000, "fv": 0, "type": 0}, None)
+    assert first == second
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    # functions of value arrays are not cached
+    handlers.npv_handler({"rate": 0.1, "values": [-1000, 3000, 4200, 6800]}, None)
+    assert cache.stats()['size'] == 1
+
+
+def test_router_handler():
+    response = handlers.router_handler({
+        "function": "pmt",
+        "rate": 0.00625,
+        "nper": 180,
+        "pv": 200000
+    }, None)
+    assert round(response.get('result'), 6) == -1854.02472
+
+    response = handlers.router_handler({
+        "function": "pmt",
+        "batch": [{"rate": 0.00625, "nper": 180, "pv": 200000}]
+    }, None)
+    assert round(response.get('results')[0].get('result'), 6) == -1854.02472
+
+
+def test_router_handler_calls():
+    response = handlers.router_handler({
+        "calls": [
+            {"function": "pmt", "rate": 0.00625, "nper": 180, "pv": 200000},
+            {"function": "irr", "values": [-100, 39, 59, 55, 20]},
+            {"function": "pmt", "rate": 0.00625, "nper": 180},
+            {"function": "unknown"},
+            {"rate": 0.00625}
+        ]
+    }, None)
+    results = response.get('results')
+    assert round(results[0].get('result'), 6) == -1854.02472
+    assert round(results[1].get('result'), 5) == 0.28095
+    assert results[2] == {'error': REQUIRED_PROPERTY_ERR.format("pv")}
+    assert results[3].get('error').startswith("'unknown' is not one of")
+    assert results[4] == {'error': REQUIRED_PROPERTY_ERR.format("function")}
+
+
+def test_router_unknown_function():
+    response = handlers.router_handler({"function": "unknown"}, None)
+    assert response.get('error').startswith("'unknown' is not one of")
+
+
+def test_router_missing_function():
+    response = handlers.router_handler({"rate": 0.00625}, None)
+    assert 'error' in response
+
+
+def test_router_function_not_a_string():
+    response = handlers.router_handler({"calls": [{"function": ["pmt"]}, {"function": "pmt", "rate": 0.1,
+                                                                         "nper": 10, "pv": 1000}]}, None)
+    results = response['results']
+    assert results[0] == {'error': "['pmt'] is not of type 'string'"}
+    assert 'result' in results[1]
+
+
+def test_warmup():
+    for handler in [handlers.fv_handler, handlers.irr_handler, handlers.router_handler]:
+        response = handler({"warmup": True}, None)
+        assert 'warmup' in response
+        timings = response.get('warmup')
+        assert set(timings['functions']) == set(['fv', 'pv', 'npv', 'pmt', 'ppmt', 'irr', 'mirr', 'nper', 'rate',
+                                                 'amortization', 'npv_update'])
+        assert timings['total'] >= timings['imports'] + timings['schemas']
+    assert 'scipy.optimize' in sys.modules
+    assert 'jsonschema' in sys.modules
+
+
+def test_warmup_not_true():
+    response = handlers.fv_handler({"warmup": "yes"}, None)
+    assert 'error' in response
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+import local_gateway
+
+
+def http_request(path, payload=None, method='POST', connection='keep-alive'):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    head = '{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+        method, path, len(body), connection)
+    return head.encode('latin-1') + body
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    return status, headers, json.loads(body.decode('utf-8'))
+
+
+def run_against_gateway(client, workers):
+    async def run():
+        gateway = local_gateway.Gateway(workers=workers)
+        server = await gateway.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            result = await client(reader, writer)
+            writer.close()
+            return result
+        finally:
+            server.close()
+            await server.wait_closed()
+            gateway.close()
+    return asyncio.run(run())
+
+
+def test_pipelined_requests_answered_in_order():
+    async def client(reader, writer):
+        writer.write(
+            http_request('/irr', {"values": [-100, 39, 59, 55, 20]}) +
+            http_request('/pmt', {"rate": 0.00625, "nper": 180, "pv": 200000}) +
+            http_request('/unknown', {}) +
+            http_request('/', {"function": "pmt", "rate": 0.00625, "nper": 180}) +
+            http_request('/health', method='GET', connection='close'))
+        return [await read_response(reader) for _ in range(5)]
+
+    responses = run_against_gateway(client, workers=1)
+    assert round(responses[0][2]['result'], 5) == 0.28095
+    assert round(responses[1][2]['result'], 6) == -1854.02472
+    assert responses[2][0] == 404
+    assert responses[3][2] == {'error': "'pv' is a required property"}
+    assert responses[4][0] == 200
+    assert responses[4][1]['connection'] == 'close'
+    assert [response[1]['connection'] for response in responses[:4]] == ['keep-alive'] * 4
+
+
+def test_bad_requests():
+    async def client(reader, writer):
+        writer.write(http_request('/pmt', method='GET'))
+        method_not_allowed = await read_response(reader)
+        writer.write(b'POST /pmt HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc')
+        invalid_json = await read_response(reader)
+        return method_not_allowed, invalid_json
+
+    method_not_allowed, invalid_json = run_against_gateway(client, workers=0)
+    assert method_not_allowed[0] == 405
+    assert invalid_json[0] == 400
+
+
+def test_negative_content_length():
+    async def client(reader, writer):
+        writer.write(b'POST /pmt HTTP/1.1\r\nContent-Length: -1\r\n\r\n')
+        return await read_response(reader)
+
+    status, headers, payload = run_against_gateway(client, workers=0)
+    assert status == 400
+    assert payload == {'error': 'Invalid Content-Length'}
+    assert headers['connection'] == 'close'
+
+
+def test_request_line_too_long():
+    async def client(reader, writer):
+        writer.write(b'POST /' + b'x' * local_gateway.MAX_LINE_BYTES + b' HTTP/1.1\r\n\r\n')
+        too_long = await read_response(reader)
+        reader, writer = await asyncio.open_connection(*writer.get_extra_info('peername'))
+        writer.write(b'POST /pmt HTTP/1.1\r\nX-Long: ' + b'x' * local_gateway.MAX_LINE_BYTES + b'\r\n\r\n')
+        header_too_long = await read_response(reader)
+        writer.close()
+        return too_long, header_too_long
+
+    too_long, header_too_long = run_against_gateway(client, workers=0)
+    assert too_long[0] == 431
+    assert header_too_long[0] == 431
+
+
+def test_is_cpu_bound():
+    assert local_gateway.Gateway.is_cpu_bound('irr', {"values": [-100, 100]})
+    assert local_gateway.Gateway.is_cpu_bound('pmt', {"batch": []})
+    assert local_gateway.Gateway.is_cpu_bound('', {"function": "rate"})
+    assert not local_gateway.Gateway.is_cpu_bound('pmt', {"rate": 0.1})
+    assert not local_gateway.Gateway.is_cpu_bound('', {"function": ["pmt"]})
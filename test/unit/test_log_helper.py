@@ -0,0 +1,58 @@
+import json
+import logging
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+import log_helper
+
+
+class CountingPayload(object):
+    renders = 0
+
+    def __repr__(self):
+        CountingPayload.renders += 1
+        return 'payload'
+
+
+def test_summarize_caps_lists():
+    summary = str(log_helper.PayloadSummary({"rate": 0.1, "values": list(range(25))}, max_items=3))
+    assert summary == str({"rate": 0.1, "values": [0, 1, 2, '... 22 more']})
+
+
+def test_summarize_caps_strings():
+    assert str(log_helper.PayloadSummary(['x' * 10], max_string_length=4)) == str(['xxxx...'])
+
+
+def test_summarize_caps_decoded_strings():
+    # json.loads returns unicode strings on Python 2
+    payload = json.loads('{"values": "%s"}' % ('A' * 300))
+    assert len(log_helper.PayloadSummary(payload, max_string_length=4)._truncate(payload)['values']) == 7
+
+
+def test_summarize_is_lazy():
+    logger = logging.getLogger('test_summarize_is_lazy')
+    logger.setLevel(logging.WARNING)
+    logger.info("Request: %s", log_helper.summarize([CountingPayload()]))
+    assert CountingPayload.renders == 0
+
+
+def test_sampling_filter():
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, 'message', None, None)
+    warning = logging.LogRecord('test', logging.WARNING, __file__, 1, 'message', None, None)
+    assert not log_helper.SamplingFilter(0).filter(record)
+    assert log_helper.SamplingFilter(0).filter(warning)
+    assert log_helper.SamplingFilter(1).filter(record)
+
+
+def test_get_logger_sample_rate(monkeypatch):
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '0.5')
+    logger = log_helper.getLogger('test_get_logger_sample_rate')
+    log_helper.getLogger('test_get_logger_sample_rate')
+    assert len([f for f in logger.filters if isinstance(f, log_helper.SamplingFilter)]) == 1
+
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '1')
+    logger = log_helper.getLogger('test_get_logger_sample_rate')
+    assert not logger.filters
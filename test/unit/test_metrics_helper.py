@@ -0,0 +1,95 @@
+import base64
+import json
+import struct
+import pytest
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+import cache_helper
+import metrics_helper
+import lambda_handlers as handlers
+
+
+@pytest.fixture
+def sink():
+    sink = metrics_helper.MemorySink()
+    previous = metrics_helper.set_sink(sink)
+    yield sink
+    metrics_helper.set_sink(previous)
+
+
+def test_timed_handler_emits_record(sink):
+    response = handlers.npv_handler({
+        "rate": 0.1,
+        "values": [-1000, 3000, 4200, 6800]
+    }, None)
+    assert 'result' in response
+    assert len(sink.records) == 1
+
+    record = sink.records[0]
+    assert record['Function'] == 'NPV'
+    assert record['InputItems'] == 5
+    assert record['ResponseBytes'] == len('{"result": 10307.287753568744}')
+    for name in metrics_helper.TIME_METRICS:
+        assert record[name] >= 0
+    assert record['ValidationTime'] > 0
+    assert record['ComputeTime'] > 0
+    assert record['TotalTime'] >= record['ValidationTime'] + record['ComputeTime'] + record['SerializationTime']
+
+    metrics = record['_aws']['CloudWatchMetrics'][0]
+    assert metrics['Dimensions'] == [['Function']]
+    assert set(metric['Name'] for metric in metrics['Metrics']) == set(metrics_helper.TIME_METRICS + ['InputItems', 'ResponseBytes'])
+
+
+def test_timed_batch_input_items(sink):
+    handlers.pmt_handler({
+        "batch": [
+            {"rate": 0.00625, "nper": 180, "pv": 200000},
+            {"rate": 0.00625, "nper": 180, "pv": 200000, "fv": 300000}
+        ]
+    }, None)
+    assert sink.records[0]['InputItems'] == 7
+
+
+def test_timed_base64_input_items(sink):
+    values = base64.b64encode(struct.pack('<4d', -1000, 3000, 4200, 6800)).decode('ascii')
+    handlers.npv_handler({"rate": 0.1, "values": values}, None)
+    assert sink.records[0]['InputItems'] == 5
+
+
+def test_phase_outside_invocation():
+    with metrics_helper.phase('ComputeTime'):
+        pass
+
+
+def test_disabled():
+    previous = metrics_helper.set_sink(None)
+    try:
+        assert 'result' in handlers.pmt_handler({"rate": 0.00625, "nper": 180, "pv": 200000}, None)
+    finally:
+        metrics_helper.set_sink(previous)
+
+
+def test_timed_cache_counts(sink, monkeypatch):
+    monkeypatch.setattr(handlers, '__result_cache', cache_helper.LRUCache(1, 300))
+    handlers.rate_handler({"nper": 6, "pmt": -200, "pv": 1000}, None)
+    handlers.rate_handler({"nper": 6, "pmt": -200, "pv": 1000}, None)
+    handlers.rate_handler({"nper": 6, "pmt": -200, "pv": 2000}, None)
+    assert [record.get('CacheHits', 0) for record in sink.records] == [0, 1, 0]
+    assert [record.get('CacheMisses', 0) for record in sink.records] == [1, 0, 1]
+    assert [record.get('CacheEvictions', 0) for record in sink.records] == [0, 0, 1]
+
+
+def test_timed_nested_handlers(sink):
+    handlers.router_handler({"function": "pmt", "rate": 0.00625, "nper": 180, "pv": 200000}, None)
+    # the handler the router calls adds its phases to the router's record instead of emitting its own
+    assert [record['Function'] for record in sink.records] == ['Router']
+    record = sink.records[0]
+    assert record['ComputeTime'] > 0
+    response = handlers.pmt_handler({"rate": 0.00625, "nper": 180, "pv": 200000}, None)
+    assert record['ResponseBytes'] == len(json.dumps(response))
+    assert [record['Function'] for record in sink.records] == ['Router', 'PMT']
+    assert sink.records[1]['ValidationTime'] > 0
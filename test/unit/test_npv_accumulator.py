@@ -0,0 +1,74 @@
+import json
+import pytest
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+from datetime import date
+import financial_functions as ff
+import npv_accumulator
+
+
+def test_periodic_flows_match_npv():
+    values = [-1000, 3000, 4200, 6800]
+    accumulator = npv_accumulator.NpvAccumulator(0.1)
+    for period, value in enumerate(values):
+        accumulator.append(value, period)
+    assert round(accumulator.npv(), 8) == round(ff.npv(0.1, values), 8)
+    assert accumulator.count == 4
+
+
+def test_dated_flows_match_xnpv():
+    values = [-100, 20, 40, 25]
+    dates = [date(2016, 1, 1), date(2016, 4, 1), date(2016, 10, 1), date(2017, 2, 1)]
+    accumulator = npv_accumulator.NpvAccumulator([0.05, 0.1])
+    for value, when in zip(values, dates):
+        accumulator.append(value, when.isoformat())
+    assert accumulator.start_date == date(2016, 1, 1)
+    npvs = accumulator.npv()
+    assert round(npvs[0], 10) == round(ff.xnpv(0.05, values, dates), 10)
+    assert round(npvs[1], 10) == round(ff.xnpv(0.1, values, dates), 10)
+
+
+def test_remove():
+    accumulator = npv_accumulator.NpvAccumulator(0.1)
+    accumulator.append(-1000, 0)
+    accumulator.append(500, 1)
+    accumulator.append(700, 2)
+    accumulator.remove(500, 1)
+    assert round(accumulator.npv(), 10) == round(-1000 + 700 / 1.21, 10)
+    assert accumulator.count == 2
+
+
+def test_serialization_round_trip():
+    accumulator = npv_accumulator.NpvAccumulator([0.05, 0.1], '2016-01-01')
+    accumulator.append(-100, date(2016, 1, 1))
+    state = json.loads(json.dumps(accumulator.to_dict()))
+    restored = npv_accumulator.NpvAccumulator.from_dict(state)
+    restored.append(20, date(2016, 4, 1))
+    accumulator.append(20, date(2016, 4, 1))
+    assert restored.npv() == accumulator.npv()
+    assert restored.to_dict() == accumulator.to_dict()
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        npv_accumulator.NpvAccumulator([])
+    with pytest.raises(ValueError):
+        npv_accumulator.NpvAccumulator([0.1] * (npv_accumulator.MAX_RATES + 1))
+    with pytest.raises(ValueError):
+        npv_accumulator.NpvAccumulator(0.1).remove(1, 1)
+    accumulator = npv_accumulator.NpvAccumulator(0.1)
+    accumulator.append(1, 1)
+    with pytest.raises(ValueError):
+        accumulator.append(1, '2016-01-01')
+
+
+def test_discount_factor_overflow():
+    assert npv_accumulator.discount_factor(0.1, 2) == 1.1 ** -2
+    assert npv_accumulator.discount_factor(-0.5, 2000) == float('inf')
+    accumulator = npv_accumulator.NpvAccumulator([0.1, -0.5])
+    accumulator.append(20, 2000)
+    assert accumulator.npv()[1] == float('inf')
@@ -0,0 +1,86 @@
+import pytest
+
+# make sure we can find the app code
+import sys, os
+my_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, my_path + '/../../code/')
+
+from jsonschema import validate
+from jsonschema.exceptions import ValidationError
+import validation_helper
+import validation_json_schemas as schemas
+
+
+def test_get_validator_memoized():
+    assert validation_helper.get_validator(schemas.pmt_schema) is validation_helper.get_validator(schemas.pmt_schema)
+    assert validation_helper.get_fast_check(schemas.pmt_schema) is validation_helper.get_fast_check(schemas.pmt_schema)
+
+
+def test_fast_check_flat_schemas():
+    for schema in [schemas.fv_schema, schemas.pv_schema, schemas.pmt_schema, schemas.ppmt_schema,
+                   schemas.nper_schema, schemas.rate_schema]:
+        assert validation_helper.get_fast_check(schema) is not None
+
+
+def test_fast_check_number_array_schemas():
+    for schema in [schemas.npv_schema, schemas.irr_schema, schemas.mirr_schema]:
+        assert validation_helper.get_fast_check(schema) is not None
+    assert validation_helper.get_fast_check(schemas.batch_schema) is None
+
+
+def test_fast_check_number_array():
+    fast_check = validation_helper.get_fast_check(schemas.npv_schema)
+    assert fast_check({"rate": 0.1, "values": [-100, 50.5, 60]})
+    assert fast_check({"rate": 0.1, "values": "AAAAAAAA8D8=", "analytics": True})
+    assert not fast_check({"rate": 0.1, "values": [-100, "50", 60]})
+    assert not fast_check({"rate": 0.1, "values": [-100, True, 60]})
+    assert not fast_check({"rate": 0.1, "values": [-100, float('nan'), 60]})
+    assert not fast_check({"rate": 0.1, "values": "not base64!"})
+    assert not fast_check({"rate": 0.1, "values": [-100, 60], "analytics": 1})
+
+    fast_check = validation_helper.get_fast_check(schemas.irr_schema)
+    assert not fast_check({"values": []})
+
+
+def test_fast_check():
+    fast_check = validation_helper.get_fast_check(schemas.ppmt_schema)
+    assert fast_check({"rate": 0.1, "per": 1, "nper": 3, "pv": 1000, "type": 1})
+    assert not fast_check({"rate": 0.1, "per": 0, "nper": 3, "pv": 1000})
+    assert not fast_check({"rate": 0.1, "per": 1, "nper": 3, "pv": 1000, "type": 2})
+    assert not fast_check({"rate": 0.1, "per": 1, "nper": 3, "pv": True})
+    assert not fast_check({"rate": 0.1, "per": 1, "nper": 3})
+    assert not fast_check({"rate": 0.1, "per": 1, "nper": 3, "pv": 1000, "extra": 1})
+    assert not fast_check([])
+
+    fast_check = validation_helper.get_fast_check(schemas.fv_schema)
+    assert fast_check({"rate": 0.1, "nper": 3, "pmt": -100})
+    assert fast_check({"rate": 0.1, "nper": 3, "pv": -100})
+    assert not fast_check({"rate": 0.1, "nper": 3})
+
+
+@pytest.mark.parametrize("arguments", [
+    {"rate": 0.00625, "nper": 180, "pv": 200000},
+    {"rate": 0.00625, "nper": 180},
+    {"rate": "0.00625", "nper": 180, "pv": 200000},
+    {"rate": 0.00625, "nper": 180, "pv": 200000, "type": 3},
+    {"rate": 0.00625, "nper": 180, "pv": 200000, "other": 1},
+])
+def test_find_error_matches_jsonschema(arguments):
+    err = validation_helper.find_error(arguments, schemas.pmt_schema)
+    try:
+        validate(arguments, schemas.pmt_schema)
+        assert err is None
+    except ValidationError as expected:
+        assert err.message == expected.message
+
+
+@pytest.mark.parametrize("values, message, index", [
+    ([-100, 50, "test", 60, "other"], "'test' is not of type 'number'", 2),
+    ([-100, None, 60], "None is not of type 'number'", 1),
+    ([-100, 50, float('inf'), float('nan')], "inf is not a finite number", 2),
+    ([-100, 50, 10 ** 400, 60], "%r is not a finite number" % 10 ** 400, 2),
+])
+def test_find_error_first_offending_index(values, message, index):
+    err = validation_helper.find_error({"values": values}, schemas.irr_schema)
+    assert err.message == message
+    assert list(err.path) == ["values", index]